@@ -11,6 +11,13 @@ from flask import Flask, session
 from jsonschema import validate as jsonschema_validate
 
 from .utils.background import turbo
+from .utils.tracer import tracer
+from .jworg.fetcher import Fetcher
+from .jworg.http_cache import HttpCache
+from .jworg.rate_limit import RateLimiter
+from .jworg.metadata_cache import MetadataCache
+from .jworg.meetings import MeetingLoader
+from .jworg.cassette import Cassette
 from .utils.babel import init_babel, compile_babel_catalogs
 
 logger = logging.getLogger(__name__)
@@ -44,7 +51,25 @@ def create_app():
 		# Cache settings
 		MEDIA_CACHEDIR = os.path.join(app.instance_path, "cache", "media"),
 		GDRIVE_CACHEDIR = os.path.join(app.instance_path, "cache", "gdrive"),
+		GDRIVE_CACHE_MAX_SIZE = 1024 * 1024 * 1024,	# bytes of remote zip files
 		FLASK_CACHEDIR = os.path.join(app.instance_path, "cache", "flask"),
+		HTTP_CACHEDIR = os.path.join(app.instance_path, "cache", "http"),
+		HTTP_CACHE_MAX_SIZE = 64 * 1024 * 1024,		# bytes
+		METADATA_CACHE_FILE = os.path.join(app.instance_path, "cache", "metadata.db"),
+		METADATA_CACHE_TTL = 7 * 86400,				# seconds to keep video metadata
+		METADATA_CACHE_NEGATIVE_TTL = 3600,			# seconds to remember video not available
+		FETCHER_RATE_LIMITS = {},					# overrides of RateLimiter.default_limits
+		DOWNLOAD_SEGMENTS = 1,						# parallel byte ranges for large downloads
+		LINK_RESOLUTION_WORKERS = 4,				# threads resolving links in meeting articles
+		MEDIA_DOWNLOAD_WORKERS = 3,					# threads downloading a meeting's media
+		ARTICLE_CACHE_MAX_SIZE = 32 * 1024 * 1024,	# bytes of parsed linked articles kept in memory
+		ARTICLE_CACHE_MAX_AGE = 3600,				# seconds before a parsed linked article is loaded again
+		FETCHER_CASSETTE = None,					# "record:DIRECTORY" or "replay:DIRECTORY"
+		MEETING_CACHE_MAX_AGE = 86400,				# seconds before cached meeting media is checked again
+		MEETING_MEDIA_FROM_EPUB = False,			# extract from downloaded EPUBs when available
+		DEBUG_DUMP_LEVEL = 0,						# dump downloaded pages and API responses
+		DEBUG_DUMP_DIR = None,						# write dumps here rather than to the log
+		TRACER_MAX_RUNS = 10,						# timings kept for the KH Player debug page
 
 		# Pub Tools includes several subapps which can be enabled or disabled
 		ENABLED_SUBAPPS = [
@@ -73,6 +98,10 @@ def create_app():
 	# Overlay default configuration above with values from instance/config.py
 	app.config.from_pyfile("config.py")
 
+	# Allow a cassette to be selected from the environment for tests and benchmarks
+	if "FETCHER_CASSETTE" in os.environ:
+		app.config["FETCHER_CASSETTE"] = os.environ["FETCHER_CASSETTE"]
+
 	# If UI_LANGUAGE is still unset, get default from environment
 	if app.config["UI_LANGUAGE"] is None:
 		try:
@@ -121,6 +150,84 @@ def create_app():
 			"WHOOSH_PATH": { "type": "string" },
 			"MEDIA_CACHEDIR": { "type": "string" },
 			"GDRIVE_CACHEDIR": { "type": "string" },
+			"GDRIVE_CACHE_MAX_SIZE": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"HTTP_CACHEDIR": { "type": "string" },
+			"HTTP_CACHE_MAX_SIZE": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"DOWNLOAD_SEGMENTS": {
+				"type": "integer",
+				"minimum": 1,
+				"maximum": 16,
+			},
+			"LINK_RESOLUTION_WORKERS": {
+				"type": "integer",
+				"minimum": 1,
+				"maximum": 16,
+			},
+			"MEDIA_DOWNLOAD_WORKERS": {
+				"type": "integer",
+				"minimum": 1,
+				"maximum": 16,
+			},
+			"ARTICLE_CACHE_MAX_SIZE": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"ARTICLE_CACHE_MAX_AGE": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"FETCHER_CASSETTE": {
+				"type": ["string", "null"],
+				"pattern": "^(record|replay):",
+			},
+			"MEETING_MEDIA_FROM_EPUB": { "type": "boolean" },
+			"DEBUG_DUMP_LEVEL": {
+				"type": "integer",
+				"minimum": 0,
+				"maximum": 2,
+			},
+			"DEBUG_DUMP_DIR": { "type": ["string", "null"] },
+			"TRACER_MAX_RUNS": {
+				"type": "integer",
+				"minimum": 1,
+			},
+			"MEETING_CACHE_MAX_AGE": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"METADATA_CACHE_FILE": { "type": "string" },
+			"METADATA_CACHE_TTL": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"METADATA_CACHE_NEGATIVE_TTL": {
+				"type": "integer",
+				"minimum": 0,
+			},
+			"FETCHER_RATE_LIMITS": {
+				"type": "object",
+				"additionalProperties": {
+					"type": "object",
+					"properties": {
+						"interval": {
+							"type": "number",
+							"minimum": 0,
+						},
+						"burst": {
+							"type": "integer",
+							"minimum": 1,
+						},
+					},
+					"required": ["interval", "burst"],
+					"additionalProperties": False,
+				},
+			},
 			"SECRET_KEY": {
 				"type": "string",
 				"minLength": 16,
@@ -196,6 +303,24 @@ def create_app():
 		#"additionalProperties": False,
 	})
 
+	# Cache pages, API responses, and video metadata from JW.ORG and limit how fast we request them
+	Fetcher.http_cache = HttpCache(app.config["HTTP_CACHEDIR"], max_size=app.config["HTTP_CACHE_MAX_SIZE"])
+	Fetcher.rate_limiter = RateLimiter(app.config["FETCHER_RATE_LIMITS"])
+	Fetcher.download_segments = app.config["DOWNLOAD_SEGMENTS"]
+	Fetcher.metadata_cache = MetadataCache(
+		app.config["METADATA_CACHE_FILE"],
+		ttl = app.config["METADATA_CACHE_TTL"],
+		negative_ttl = app.config["METADATA_CACHE_NEGATIVE_TTL"],
+		)
+	MeetingLoader.link_workers = app.config["LINK_RESOLUTION_WORKERS"]
+	MeetingLoader.article_cache.max_size = app.config["ARTICLE_CACHE_MAX_SIZE"]
+	MeetingLoader.article_cache.max_age = app.config["ARTICLE_CACHE_MAX_AGE"]
+	if app.config["FETCHER_CASSETTE"] is not None:
+		Fetcher.cassette = Cassette.from_spec(app.config["FETCHER_CASSETTE"])
+	Fetcher.debug_dump_level = app.config["DEBUG_DUMP_LEVEL"]
+	Fetcher.debug_dump_dir = app.config["DEBUG_DUMP_DIR"]
+	tracer.max_runs = app.config["TRACER_MAX_RUNS"]
+
 	# Init DB
 	with app.app_context():
 		from .models import init_app as models_init_app
@@ -220,7 +345,7 @@ def create_app():
 
 	# Load, initialize, and connect app components
 	with app.app_context():
-		for module_name in ("views", "subapps", "cli", "cli_jworg", "cli_cache", "cli_shortcut"):
+		for module_name in ("views", "subapps", "cli", "cli_jworg", "cli_cache", "cli_shortcut", "cli_bench"):
 			logger.debug("Loading module %s..." % module_name)
 			module = import_module("app.%s" % module_name)
 			module.init_app(app)
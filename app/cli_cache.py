@@ -1,8 +1,14 @@
 """CLI for managing the media cache"""
 
+from time import time
+
 from flask.cli import AppGroup
+import click
+from rich.console import Console
+from rich.table import Table
 
 from .utils.cache_maint import scan_cache
+from .jworg.fetcher import Fetcher
 
 cli_cache = AppGroup("cache", help="Cache maintanance")
 
@@ -18,3 +24,38 @@ def cmd_cache_status():
 def cmd_cache_clean():
 	"""Remove old files from cache"""
 	scan_cache(clean=True)
+
+@cli_cache.command("http-status")
+@click.option("--list", "list_entries", is_flag=True, help="List the cached URLs")
+def cmd_cache_http_status(list_entries):
+	"""Show usage of the cache of pages from JW.ORG"""
+	http_cache = Fetcher.http_cache
+	entries = sorted(http_cache.entries(), key=lambda entry: entry.mtime, reverse=True)
+	if list_entries:
+		now = time()
+		table = Table(show_header=True, title="HTTP Cache Entries")
+		table.add_column("URL")
+		table.add_column("Bytes", justify="right")
+		table.add_column("Age (minutes)", justify="right")
+		table.add_column("Fresh")
+		for entry in entries:
+			table.add_row(entry.url, str(entry.size), str(int((now - entry.stored) / 60)), "yes" if entry.is_fresh() else "no")
+		Console().print(table)
+	total_size = sum(entry.size for entry in entries)
+	print("Directory: %s" % http_cache.cachedir)
+	print("Entries: %d" % len(entries))
+	print("Size: %.1f of %.1f megabytes" % (total_size / 1048576, http_cache.max_size / 1048576))
+	stats = http_cache.stats()
+	print("Since cleared: %d hits, %d revalidated, %d misses" % (stats["hits"], stats["revalidations"], stats["misses"]))
+
+@cli_cache.command("http-clear")
+def cmd_cache_http_clear():
+	"""Empty the cache of pages from JW.ORG"""
+	Fetcher.http_cache.clear()
+	print("HTTP cache cleared")
+
+@cli_cache.command("metadata-clear")
+def cmd_cache_metadata_clear():
+	"""Empty the cache of video metadata from JW.ORG"""
+	print("Removing %d entries" % Fetcher.metadata_cache.count())
+	Fetcher.metadata_cache.clear()
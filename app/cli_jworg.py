@@ -2,9 +2,10 @@
 
 import os
 from datetime import date, timedelta
-from time import sleep
+from time import sleep, perf_counter
 import logging
 from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from flask import current_app
 from flask.cli import AppGroup
@@ -14,15 +15,18 @@ from rich.console import Console
 from rich.table import Table
 from rich import print as rich_print
 
-from .models import db, PeriodicalIssues, Articles, Weeks, Books, VideoCategories, Videos
+from .models import db, PeriodicalIssues, Articles, Weeks, Books, VideoCategories, Videos, MeetingCache
 from .models_whoosh import video_index, illustration_index
 from .jworg.publications import PubFinder
 from .jworg.meetings import MeetingLoader
 from .jworg.videos import VideoLister
 from .jworg.epub import EpubLoader
+from .jworg.meetings_epub import EpubMeetingLoader
 from .jworg.hrange import HighlightRange
 from .jworg.jwstream import StreamRequester
+from .jworg.cassette import Cassette
 from .utils.babel import gettext as _
+from .utils.context import copy_current_context
 
 logger = logging.getLogger(__name__)
 
@@ -90,7 +94,7 @@ def update_weeks(year=None, week=None, nweeks=8, callback=None):
 	if year is not None:
 		to_fetch = [[year, week]]
 	else:
-		to_fetch = upcoming_weeks(nweeks)
+		to_fetch = [(year, week) for year, week, week_obj in upcoming_weeks(nweeks) if week_obj is None]
 	count = 0
 	for year, week in to_fetch:
 		update_week(year, week, count, len(to_fetch), meeting_loader, callback)
@@ -98,16 +102,17 @@ def update_weeks(year=None, week=None, nweeks=8, callback=None):
 	db.session.commit()
 	callback(_("Weeks loaded"), last_message=True)
 
+# Return the year, week number, and DB row (or None if we do not yet have
+# its schedule) of this week and the n-1 weeks which follow
 def upcoming_weeks(n):
 	current_day = date.today()
-	to_fetch = []
+	weeks = []
 	for i in range(n):
 		year, week = current_day.isocalendar()[:2]
 		week_obj = Weeks.query.filter_by(year=year, week=week).one_or_none()
-		if week_obj is None:
-			to_fetch.append((year, week))
+		weeks.append((year, week, week_obj))
 		current_day += timedelta(weeks=1)
-	return to_fetch
+	return weeks
 
 def update_week(year, week, count, total, meeting_loader, callback):
 	callback(_("Fetching week %s %s") % (year, week))
@@ -126,6 +131,102 @@ def cmd_show_weeks():
 	"""List weekly meeting materials in DB"""
 	print_query_result_table(Weeks.query, "Weekly Meeting Materials")
 
+@cli_jworg.command("prefetch-meetings")
+@click.option("--weeks", "nweeks", default=4, help="Number of weeks starting with this one")
+@click.option("--workers", default=4, help="Number of meetings to extract at once")
+@click.option("--download", is_flag=True, help="Also download the videos and images")
+@click.option("--force", is_flag=True, help="Extract meetings again even if they are in the cache")
+def cmd_prefetch_meetings(nweeks, workers, download, force):
+	"""Extract the media lists of upcoming meetings"""
+	language = current_app.config["PUB_LANGUAGE"]
+	timings = []
+
+	# Stage 1: Load the schedules of any of these weeks which we do not yet have
+	start = perf_counter()
+	update_weeks(nweeks=nweeks, callback=basic_callback)
+	timings.append((_("Load weekly schedules"), nweeks, perf_counter() - start))
+
+	docids = []
+	for year, week, week_obj in upcoming_weeks(nweeks):
+		if week_obj is not None:
+			for docid in (week_obj.mwb_docid, week_obj.watchtower_docid):
+				if docid is not None:
+					docids.append(docid)
+
+	if not force:
+		docids = [docid for docid in docids if MeetingCache.query.filter_by(lang=language, docid=docid, extraction_version=MeetingLoader.extraction_version).one_or_none() is None]
+
+	# Stage 2: Extract the media lists. The requests are made from worker
+	# threads, but the results are stored in the DB from this thread.
+	# The workers get the app context so that part titles are translated.
+	def extract(docid):
+		meeting_loader = MeetingLoader(language=language)
+		start = perf_counter()
+		media = list(meeting_loader.extract_media(meeting_loader.meeting_url(docid), callback=lambda message, **kwargs: logger.debug("%s: %s", docid, message)))
+		return media, perf_counter() - start
+
+	start = perf_counter()
+	meetings = {}
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		futures = {executor.submit(copy_current_context(extract), docid): docid for docid in docids}
+		for future in as_completed(futures):
+			docid = futures[future]
+			try:
+				media, elapsed = future.result()
+			except Exception as e:
+				print("Failed to extract %s: %s" % (docid, e))
+				continue
+			print("Extracted %d items from %s in %.1f seconds" % (len(media), docid, elapsed))
+			MeetingCache.store(language, docid, list(map(lambda item: asdict(item), media)), MeetingLoader.extraction_version)
+			meetings[docid] = media
+	timings.append((_("Extract media lists"), len(docids), perf_counter() - start))
+
+	# Stage 3: Download the media files into the cache
+	if download:
+		start = perf_counter()
+		items = {}
+		for docid in docids:
+			if docid not in meetings:
+				continue
+			for item in meetings[docid]:
+				if item.media_type in ("video", "image"):
+					items.setdefault(item.media_url, item)
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			futures = {
+				executor.submit(prefetch_media_item, item, language, current_app.config["MEDIA_CACHEDIR"], current_app.config["VIDEO_RESOLUTION"]): item
+				for item in items.values()
+				}
+			for future in as_completed(futures):
+				item = futures[future]
+				try:
+					future.result()
+				except Exception as e:
+					print("Failed to download \"%s\": %s" % (item.title, e))
+				else:
+					print("Downloaded \"%s\"" % item.title)
+		timings.append((_("Download media"), len(items), perf_counter() - start))
+
+	table = Table(show_header=True, title="Prefetch Timing")
+	for column in ("Stage", "Items", "Seconds"):
+		table.add_column(column)
+	for stage, count, elapsed in timings:
+		table.add_row(stage, str(count), "%.1f" % elapsed)
+	Console().print(table)
+
+# Download a video or image from a meeting's media list into the media cache.
+# This runs in a worker thread, so it cannot use current_app.
+def prefetch_media_item(item, language, cachedir, resolution):
+	meeting_loader = MeetingLoader(language=language, cachedir=cachedir)
+	if item.media_type == "video":
+		video_metadata = meeting_loader.get_video_metadata(item.media_url, resolution=resolution)
+		assert video_metadata is not None and video_metadata["url"] is not None, "Can't get metadata for %s" % item.media_url
+		meeting_loader.download_media(video_metadata["url"])
+		thumbnail_url = item.thumbnail_url or video_metadata["thumbnail_url"]
+		if thumbnail_url is not None:
+			meeting_loader.download_media(thumbnail_url)
+	else:
+		meeting_loader.download_media(item.media_url)
+
 #=============================================================================
 # Media Extraction Tests
 #=============================================================================
@@ -143,14 +244,41 @@ media_column_order = (
 @cli_jworg.command("get-meeting-media")
 @click.argument("docid")
 @click.option("--debug", is_flag=True)
-def cmd_get_meeting_media(docid, debug):
+@click.option("--record", metavar="DIRECTORY", help="Save the responses from JW.ORG in a cassette")
+@click.option("--replay", metavar="DIRECTORY", help="Take the responses from a cassette rather than JW.ORG")
+@click.option("--epub", metavar="FILENAME", help="Take the article from an EPUB such as mwb_U_202401.epub")
+def cmd_get_meeting_media(docid, debug, record, replay, epub):
 	"""Scrape a meeting article to get the media"""
 	if debug:
 		logging.basicConfig(level=logging.DEBUG)
-	meeting_loader = MeetingLoader(language=current_app.config["PUB_LANGUAGE"], debuglevel=1 if debug else 0)
-	url = meeting_loader.meeting_url(docid)
-	media = meeting_loader.extract_media(url, callback=basic_callback)
+	if record is not None and replay is not None:
+		raise click.UsageError("--record and --replay cannot be used together")
+	if epub is not None:
+		pub_code, lang, issue_code = os.path.splitext(os.path.basename(epub))[0].split("_", 2)
+		meeting_loader = EpubMeetingLoader(
+			EpubLoader(epub), pub_code, issue_code,
+			language = current_app.config["PUB_LANGUAGE"],
+			cachedir = current_app.config["MEDIA_CACHEDIR"],
+			debuglevel = 1 if debug else 0,
+			)
+	else:
+		meeting_loader = MeetingLoader(language=current_app.config["PUB_LANGUAGE"], debuglevel=1 if debug else 0)
+	if record is not None:
+		meeting_loader.cassette = Cassette(record, "record")
+	elif replay is not None:
+		meeting_loader.cassette = Cassette(replay, "replay")
+	start = perf_counter()
+	if epub is not None:
+		media = list(meeting_loader.extract_media(int(docid), callback=basic_callback))
+	else:
+		media = list(meeting_loader.extract_media(meeting_loader.meeting_url(docid), callback=basic_callback))
+	elapsed = perf_counter() - start
+	if epub is not None:
+		meeting_loader.epub.close()
 	print_dict_result_table(map(lambda item: asdict(item), media), "Meeting Media", order=media_column_order)
+	print("Extracted %d items in %.3f seconds" % (len(media), elapsed))
+	if meeting_loader.cassette is not None:
+		print("Cassette: %d responses recorded, %d replayed" % (meeting_loader.cassette.recorded, meeting_loader.cassette.played))
 
 @cli_jworg.command("get-article-media")
 @click.argument("url")
@@ -1,4 +1,4 @@
-import re
+from . import patterns
 
 # Basic information about a web page
 # This is used to:
@@ -9,26 +9,26 @@ class WebpageMetadata:
 		self.url = url
 		self.root = root
 
-		el = root.xpath("./head/title")
+		el = patterns.head_title(root)
 		self.title = el[0].text if len(el) > 0 else None
 
-		el = root.xpath(".//h1")
+		el = patterns.any_h1(root)
 		self.h1 = el[0].text_content().strip() if len(el) > 0 else None
 
-		el = root.xpath("./head/meta[@property='og:image']")
+		el = patterns.head_og_image(root)
 		self.thumbnail_url = el[0].attrib["content"] if len(el) > 0 else None
 
 		# If this looks like an article from JW.ORG, extract the pub code.
 		self.pub_code = None
 		self.player = None
 		article_tag = None
-		if len(el := root.xpath(".//article")) > 0:
+		if len(el := patterns.any_article(root)) > 0:
 			print("  Found <article> tag")
 			article_tag = el[0]
-			if (m := re.search(r" pub-(\S+) ", article_tag.attrib.get("class",""))):
+			if (m := patterns.class_pub_code.search(article_tag.attrib.get("class",""))):
 				print("  Found pub code")
 				self.pub_code = m.group(1)
-				if len(el := article_tag.xpath(".//div[@class='jsIncludeVideo']")) > 0:
+				if len(el := patterns.video_player(article_tag)) > 0:
 					print("  Found video player")
 					self.player = el[0].attrib["data-jsonurl"]
 				# FIXME: disabled because turns WT articles into videos
@@ -49,22 +49,22 @@ class Article:
 		self.url = url
 		self.root = root
 
-		def xpath_one(container, path):
-			elements = container.xpath(path)
-			assert len(elements) == 1, f"Expected 1 match for \"{path}\", got {len(elements)}"
+		def xpath_one(container, xpath):
+			elements = xpath(container)
+			assert len(elements) == 1, f"Expected 1 match for \"{xpath.path}\", got {len(elements)}"
 			return elements[0]
 
-		self.title = xpath_one(root, "./head/title").text
-		self.main_tag = xpath_one(root, ".//main")
-		self.article_tag = xpath_one(self.main_tag, ".//article")
-		self.h1 = xpath_one(self.article_tag, ".//h1").text_content().strip()
+		self.title = xpath_one(root, patterns.head_title).text
+		self.main_tag = xpath_one(root, patterns.any_main)
+		self.article_tag = xpath_one(self.main_tag, patterns.any_article)
+		self.h1 = xpath_one(self.article_tag, patterns.any_h1).text_content().strip()
 
 		# The article body is generally enclosed in a <div class="bodyTxt">, but
 		# there are exceptions such as Insight on the Scriptures.
-		el = self.article_tag.xpath(".//div[@class='bodyTxt']")
+		el = patterns.body_txt(self.article_tag)
 		self.bodyTxt = el[0] if len(el) > 0 else self.article_tag
 
-		og_image = self.root.xpath("./head/meta[@property='og:image']")
+		og_image = patterns.head_og_image(self.root)
 		self.thumbnail_url = og_image[0].attrib["content"] if len(og_image) > 0 else None
 
 		# Identify the publication from the <article> tag classes
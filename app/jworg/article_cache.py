@@ -0,0 +1,113 @@
+# Process-wide cache of parsed articles
+#
+# The Congregation Bible Study is linked from several weeks of the Meeting
+# Workbook and the study book chapter is the same each time. This cache
+# keeps the parsed article and its HighlightRange so that we do not
+# download and parse it again. It is shared by all threads, is keyed by
+# URL (without fragment) and language, and evicts the least-recently-used
+# entries once the estimated memory use of the element trees exceeds its cap.
+# Entries older than max_age seconds are loaded again so that corrections
+# to an article reach the media lists which are refreshed in the background.
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from urllib.parse import urldefrag
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ArticleCache:
+	def __init__(self, max_size=32*1024*1024, max_age=3600):
+		self.max_size = max_size
+		self.max_age = max_age
+		self.lock = Lock()
+		self.entries = OrderedDict()	# key -> (value, size, time loaded)
+		self.loading = {}				# key -> Lock held while the value is being loaded
+		self.total_size = 0
+		self.hits = 0
+		self.misses = 0
+		self.expirations = 0
+
+	@staticmethod
+	def make_key(url, language):
+		return (urldefrag(url).url, language)
+
+	# Return the cached value for this URL and language. If there is none,
+	# call load() to produce it. If another thread is already loading the
+	# same article, wait for it rather than loading it a second time.
+	# root is a function which returns the root element of the value so that
+	# we can estimate its size.
+	def get(self, url, language, load, root):
+		key = self.make_key(url, language)
+		while True:
+			with self.lock:
+				if key in self.entries:
+					value, size, loaded = self.entries[key]
+					if monotonic() - loaded < self.max_age:
+						self.entries.move_to_end(key)
+						self.hits += 1
+						return value
+					logger.debug("Article %s in cache has expired", key[0])
+					del self.entries[key]
+					self.total_size -= size
+					self.expirations += 1
+				key_lock = self.loading.get(key)
+				if key_lock is None:
+					key_lock = self.loading[key] = Lock()
+					key_lock.acquire()
+					self.misses += 1
+					break
+			# Someone else is loading it. Wait and look again.
+			with key_lock:
+				pass
+
+		try:
+			value = load()
+			size = self.estimate_size(root(value))
+			with self.lock:
+				self.entries[key] = (value, size, monotonic())
+				self.total_size += size
+				self._evict()
+		finally:
+			with self.lock:
+				del self.loading[key]
+			key_lock.release()
+
+		logger.debug("Article cache: %d articles, %d bytes, %d hits, %d misses", len(self.entries), self.total_size, self.hits, self.misses)
+		return value
+
+	# Remove least-recently-used entries until we are under the size cap.
+	# The newest entry is kept even if it alone exceeds the cap.
+	def _evict(self):
+		while self.total_size > self.max_size and len(self.entries) > 1:
+			key, (value, size, loaded) = self.entries.popitem(last=False)
+			logger.debug("Evicting %s from article cache", key[0])
+			self.total_size -= size
+
+	# Rough estimate of the memory used by an lxml element tree
+	@staticmethod
+	def estimate_size(root):
+		size = 0
+		for el in root.iter():
+			size += 200
+			size += len(el.text or "") + len(el.tail or "")
+			for name, value in el.attrib.items():
+				size += len(name) + len(value)
+		return size
+
+	def stats(self):
+		with self.lock:
+			return {
+				"articles": len(self.entries),
+				"size": self.total_size,
+				"max_size": self.max_size,
+				"hits": self.hits,
+				"misses": self.misses,
+				"expirations": self.expirations,
+				}
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.total_size = 0
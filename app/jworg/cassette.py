@@ -0,0 +1,117 @@
+# Record and replay the responses which Fetcher gets from JW.ORG
+#
+# In record mode every response to .get_html(), .get_json(), and .head()
+# (including errors) is saved in a cassette directory. In replay mode the responses
+# are served from the cassette without any network access, rate limiting,
+# or caching. This lets us time and test extraction of meeting media
+# repeatably and offline.
+#
+# Each response is stored as two files named with the SHA-1 hash of the key:
+# * <hash>.json -- URL, request Accept header, status, reason, and response headers
+# * <hash>.body -- the response body (after removal of gzip encoding)
+#
+# Each file is written under a temporary name and then renamed, the .json
+# last, so that an interrupted recording does not leave a partial response
+# which replay would trust.
+
+import os, json
+from hashlib import sha1
+from io import BytesIO
+from email.message import Message
+from urllib.error import HTTPError
+import logging
+
+from .fetcher import FetcherError
+
+logger = logging.getLogger(__name__)
+
+class CassetteMissError(FetcherError):
+	pass
+
+class Cassette:
+	modes = ("record", "replay")
+
+	def __init__(self, path, mode):
+		if mode not in self.modes:
+			raise ValueError(f"Cassette mode must be one of {self.modes}, not {repr(mode)}")
+		self.path = path
+		self.mode = mode
+		self.played = 0
+		self.recorded = 0
+		if mode == "record":
+			os.makedirs(path, exist_ok=True)
+		elif not os.path.isdir(path):
+			raise FileNotFoundError(f"No cassette at {path}")
+
+	# Create from a specification of the form "record:DIRECTORY" or "replay:DIRECTORY"
+	@classmethod
+	def from_spec(cls, spec):
+		mode, sep, path = spec.partition(":")
+		if not sep:
+			raise ValueError(f"Cassette must be given as record:DIRECTORY or replay:DIRECTORY, not {repr(spec)}")
+		return cls(path, mode)
+
+	@property
+	def replaying(self):
+		return self.mode == "replay"
+
+	def _path(self, key):
+		return os.path.join(self.path, sha1(key.encode("utf-8")).hexdigest())
+
+	# Save a response. An HTTPError can be passed as the response.
+	def record(self, key, url, accept, response, body):
+		path = self._path(key)
+		metadata = {
+			"key": key,
+			"url": url,
+			"accept": accept,
+			"status": response.status if not isinstance(response, HTTPError) else response.code,
+			"reason": response.reason if not isinstance(response, HTTPError) else response.msg,
+			# The body is stored decoded
+			"headers": [(name, value) for name, value in response.headers.items() if name.lower() not in ("content-encoding", "content-length")],
+			}
+		with open(path + ".body.tmp", "wb") as fh:
+			fh.write(body)
+		os.replace(path + ".body.tmp", path + ".body")
+		with open(path + ".json.tmp", "w") as fh:
+			json.dump(metadata, fh, indent=1, ensure_ascii=False)
+		os.replace(path + ".json.tmp", path + ".json")
+		self.recorded += 1
+		logger.debug("Recorded %s", url)
+
+	# Return the body of a recorded response. If the response was an error,
+	# raise the same HTTPError which the live request raised.
+	def replay(self, key):
+		return self.replay_response(key).read()
+
+	# Return a recorded response as an object with the .status, .reason,
+	# .headers, and .read() of an HTTP response
+	def replay_response(self, key):
+		path = self._path(key)
+		try:
+			with open(path + ".json") as fh:
+				metadata = json.load(fh)
+			with open(path + ".body", "rb") as fh:
+				body = fh.read()
+		except FileNotFoundError:
+			raise CassetteMissError(f"Not in cassette {self.path}: {key}")
+		self.played += 1
+		logger.debug("Replaying %s", metadata["url"])
+		headers = Message()
+		for name, value in metadata["headers"]:
+			headers[name] = value
+		if metadata["status"] >= 400:
+			raise HTTPError(metadata["url"], metadata["status"], metadata["reason"], headers, BytesIO(body))
+		return CassetteResponse(metadata, headers, body)
+
+class CassetteResponse:
+	def __init__(self, metadata, headers, body):
+		self.url = metadata["url"]
+		self.status = metadata["status"]
+		self.reason = metadata["reason"]
+		self.headers = headers
+		self.body = BytesIO(body)
+	def read(self, size=None):
+		return self.body.read(size)
+	def geturl(self):
+		return self.url
@@ -0,0 +1,172 @@
+# Keep-alive connections for urllib
+#
+# The handlers in urllib.request open a new connection for every request
+# and send "Connection: close". The handlers defined here instead keep a
+# pool of persistent HTTP/1.1 connections for each host. A connection is
+# returned to the pool once its response has been read to the end. While
+# there are idle connections, a background thread closes those which have
+# been idle for longer than idle_timeout.
+
+import http.client
+from urllib.request import HTTPHandler, HTTPSHandler, URLError
+from threading import Lock, Thread
+from time import time, sleep
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+	def __init__(self, max_per_host=4, idle_timeout=15):
+		self.max_per_host = max_per_host		# idle connections we keep for each host
+		self.idle_timeout = idle_timeout		# seconds after which we assume the server has closed
+		self.lock = Lock()
+		self.idle = {}
+		self.handshakes = 0						# new connections opened
+		self.reuses = 0							# requests sent over an existing connection
+		self.reaper = None
+
+	# Take an idle connection to the indicated host from the pool or create a new one.
+	# Returns the connection and a flag which is true if it was used before.
+	def acquire(self, key, create):
+		now = time()
+		with self.lock:
+			connections = self.idle.get(key, [])
+			while connections:
+				conn, last_used = connections.pop()
+				if now - last_used < self.idle_timeout:
+					self.reuses += 1
+					return conn, True
+				conn.close()
+			self.handshakes += 1
+		return create(), False
+
+	# Give a connection back to the pool after its response has been read
+	def release(self, key, conn):
+		with self.lock:
+			connections = self.idle.setdefault(key, [])
+			if len(connections) < self.max_per_host:
+				connections.append((conn, time()))
+				if self.reaper is None:
+					self.reaper = Thread(target=self._reap, daemon=True, name="connection reaper")
+					self.reaper.start()
+				return
+		conn.close()
+
+	# Close connections which have been idle too long. Runs in its own
+	# thread until the pool is empty.
+	def _reap(self):
+		while True:
+			sleep(self.idle_timeout / 2)
+			now = time()
+			expired = []
+			with self.lock:
+				for key, connections in self.idle.items():
+					expired.extend(conn for conn, last_used in connections if now - last_used >= self.idle_timeout)
+					connections[:] = [(conn, last_used) for conn, last_used in connections if now - last_used < self.idle_timeout]
+				done = not any(self.idle.values())
+				if done:
+					self.reaper = None
+			for conn in expired:
+				conn.close()
+			if done:
+				return
+
+	def close(self):
+		with self.lock:
+			for connections in self.idle.values():
+				for conn, last_used in connections:
+					conn.close()
+			self.idle = {}
+
+	def log_stats(self):
+		logger.debug("Connection pool: %d handshakes, %d handshakes saved", self.handshakes, self.reuses)
+
+# HTTPResponse which tells the pool when its connection is free again
+class PooledHTTPResponse(http.client.HTTPResponse):
+	on_release = None
+
+	# Called by HTTPResponse when the body has been read to the end
+	def _close_conn(self):
+		super()._close_conn()
+		self._release(reusable=not self.will_close)
+
+	# If the caller closes the response before reading all of it, the
+	# rest of the body is still in the socket, so the connection is unusable.
+	def close(self):
+		if self.fp is not None:
+			self._release(reusable=False)
+		super().close()
+
+	def _release(self, reusable):
+		on_release, self.on_release = self.on_release, None
+		if on_release is not None:
+			on_release(reusable)
+
+class KeepAliveMixin:
+	def __init__(self, pool, **kwargs):
+		super().__init__(**kwargs)
+		self.pool = pool
+
+	# Replacement for AbstractHTTPHandler.do_open()
+	def do_open(self, http_class, req, **http_conn_args):
+		host = req.host
+		if not host:
+			raise URLError("no host given")
+		key = (http_class.__name__, req._tunnel_host or host)
+
+		headers = dict(req.unredirected_hdrs)
+		headers.update({k: v for k, v in req.headers.items() if k not in headers})
+		headers["Connection"] = "keep-alive"
+		headers = {name.title(): value for name, value in headers.items()}
+		if req._tunnel_host:
+			tunnel_headers = {}
+			if "Proxy-Authorization" in headers:
+				tunnel_headers["Proxy-Authorization"] = headers.pop("Proxy-Authorization")
+
+		def create():
+			conn = http_class(host, timeout=req.timeout, **http_conn_args)
+			if req._tunnel_host:
+				conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+			return conn
+
+		while True:
+			conn, reused = self.pool.acquire(key, create)
+			conn.set_debuglevel(self._debuglevel)
+			conn.response_class = PooledHTTPResponse
+			try:
+				conn.request(req.get_method(), req.selector, req.data, headers, encode_chunked=req.has_header("Transfer-encoding"))
+				response = conn.getresponse()
+			except (ConnectionError, http.client.BadStatusLine) as e:
+				conn.close()
+				# The server closed a connection which was sitting in the pool. Try again.
+				if reused:
+					logger.debug("Pooled connection to %s was stale, retrying", key[1])
+					continue
+				raise URLError(e)
+			except OSError as e:
+				conn.close()
+				raise URLError(e)
+			break
+
+		def on_release(reusable):
+			if reusable:
+				self.pool.release(key, conn)
+			else:
+				conn.close()
+		response.on_release = on_release
+
+		# HEAD responses and empty bodies are already complete
+		if req.get_method() == "HEAD" or response.length == 0:
+			response.read()
+
+		response.url = req.get_full_url()
+		response.msg = response.reason
+		return response
+
+class KeepAliveHTTPHandler(KeepAliveMixin, HTTPHandler):
+	def http_open(self, req):
+		return self.do_open(http.client.HTTPConnection, req)
+
+class KeepAliveHTTPSHandler(KeepAliveMixin, HTTPSHandler):
+	def https_open(self, req):
+		return self.do_open(http.client.HTTPSConnection, req, context=self._context)
@@ -19,8 +19,10 @@ class EpubLoader:
 	def __init__(self, filename, toc_range=None):
 		if hasattr(filename, "read"):
 			self.zipfh = filename
+			self.close_zipfh = False		# caller's to close
 		else:
 			self.zipfh = ZipFile(filename)
+			self.close_zipfh = True
 
 		# Get the path to the OPF file out of META-INF/container.xml.
 		# Set the rootdir to its dirname.
@@ -31,6 +33,17 @@ class EpubLoader:
 		# Extract OPF metadata
 		self.opf = EpubOpf(self, opf_file_path)
 
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	# Close the Epub file, if we opened it
+	def close(self):
+		if self.close_zipfh:
+			self.zipfh.close()
+
 	# Open one of the files withing the Epub file.
 	# Return a handle and the file size.
 	def open(self, filename):
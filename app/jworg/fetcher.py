@@ -1,16 +1,25 @@
 import os, json, re
-from urllib.request import Request, HTTPHandler, HTTPSHandler, HTTPError, HTTPErrorProcessor, build_opener
+from io import BytesIO
+from copy import deepcopy
+from itertools import count
+from threading import Lock
+from weakref import WeakValueDictionary
+from urllib.request import Request, HTTPError, HTTPErrorProcessor, build_opener, url2pathname
 from urllib.parse import urlparse, parse_qsl, urlencode, unquote
 import ssl
 from gzip import GzipFile
-from time import sleep, time
-from functools import cache
+from time import time, monotonic
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
 
 import lxml.html
 
 from ..utils.babel import gettext as _
+from ..utils.tracer import tracer
 from .wtcodes import iso_language_code_to_meps
+from .rate_limit import RateLimiter
+from .connection_pool import ConnectionPool, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+from . import patterns
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +29,9 @@ class FetcherError(Exception):
 class FetcherNoMediaError(FetcherError):
 	pass
 
+class FetcherChangedError(FetcherError):
+	pass
+
 class NoRedirects(HTTPErrorProcessor):
 	def http_response(self, request, response):
 		if response.code in (301, 302, 303, 307):
@@ -27,6 +39,16 @@ class NoRedirects(HTTPErrorProcessor):
 		else:
 			return super.http_response(request, response)
 
+# Text which is produced by calling a function only when it is converted
+# to a string, such as by the logger if the message is actually logged.
+class LazyText:
+	def __init__(self, func, *args, **kwargs):
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+	def __str__(self):
+		return self.func(*self.args, **self.kwargs)
+
 class GzipResponseWrapper:
 	def __init__(self, response):
 		self.response = response
@@ -41,14 +63,61 @@ class GzipResponseWrapper:
 	@property
 	def status(self):
 		return self.response.status
+	@property
+	def reason(self):
+		return self.response.reason
 
 class Fetcher:
 	user_agent = "Mozilla/5.0"
 
 	request_timeout = 30
 
-	# Minimum time between requests (in seconds)
-	min_request_interval = 2.5
+	# Limits on how fast we send requests to each host. This is shared by
+	# all instances so that background threads and request handlers draw
+	# from the same budget. create_app() replaces it with one built from
+	# FETCHER_RATE_LIMITS.
+	rate_limiter = RateLimiter()
+
+	# Persistent connections, shared by all instances so that a connection
+	# opened while handling one request can be used by the next.
+	connection_pool = ConnectionPool()
+
+	# Number of byte ranges to download at the same time for files larger
+	# than segmented_download_threshold. (One means download in one piece.)
+	download_segments = 1
+	segmented_download_threshold = 16 * 1024 * 1024
+
+	# Seconds between saves of the progress of a segmented download, so
+	# that it can be resumed even if we are killed
+	download_state_interval = 5
+
+	# A lock for each file which is being downloaded, so that threads which
+	# want the same file take turns rather than both writing its .tmp file.
+	# An entry goes away once no thread holds or waits for its lock.
+	download_locks = WeakValueDictionary()
+	download_locks_lock = Lock()
+
+	# Pub Media manifests loaded by this process, shared by all instances
+	# so that the link workers of one article (and the next request) do
+	# not each fetch the same manifest, even when there is no metadata
+	# cache or a cassette is in use. Keyed by (pub, issue, meps_language).
+	# Entries are (time loaded, index, error) and are kept for
+	# manifest_memo_ttl seconds. manifest_loading holds a lock for each
+	# manifest which some thread is fetching.
+	manifest_memo = {}
+	manifest_memo_ttl = 600
+	manifest_loading = {}
+	manifest_memo_lock = Lock()
+
+	# How much of what is downloaded to dump for debugging: 0 for nothing,
+	# 1 for API responses, 2 for every figure of the meeting articles too.
+	# If debug_dump_dir is set, the dumps go to files there (only the most
+	# recent debug_dump_keep are kept) rather than to the log.
+	debug_dump_level = 0
+	debug_dump_dir = None
+	debug_dump_keep = 200
+	debug_dump_counter = count(1)
+	debug_dump_lock = Lock()
 
 	# This API endpoint is used used to find the media files (MP3, MP4) which go
 	# with a printed publication or the publication itself in downloadable
@@ -92,38 +161,59 @@ class Fetcher:
 	# It is necessary to parse the HTML to get the links to the articles and their docids.
 	week_url = "https://wol.jw.org/en/wol/meetings/r1/lp-e/{year}/{week}"
 
+	# On-disk cache of responses to .get_html() and .get_json(). This is
+	# shared by all instances and is set up by create_app().
+	http_cache = None
+
+	# Persistent cache of video metadata. Also set up by create_app().
+	metadata_cache = None
+
+	# If set to a Cassette, .get_html(), .get_json(), and .head() record
+	# their responses to it or replay them from it. Set by create_app() or a CLI command.
+	cassette = None
+
 	def __init__(self, language=None, cachedir=None, debuglevel=0):
 		if language is None:
 			raise FetcherError("Language must be set")
 		self.language = language
 		self.meps_language = iso_language_code_to_meps(language)
 		self.cachedir = cachedir
-		self.last_request_time = 0
 
 		# As of December 2025 fetches of Watchtower articles hang from Windows Python 3.12.
 		context = ssl.create_default_context()
 		context.set_ciphers("HIGH:!aNULL:!MD5:!RC4:!DHE")
 
-		http_handler = HTTPHandler(debuglevel=debuglevel)
-		https_handler = HTTPSHandler(debuglevel=debuglevel, context=context)
+		# Keep connections open so that we can reuse them for later requests
+		# to the same host rather than repeating the TCP and TLS handshakes.
+		http_handler = KeepAliveHTTPHandler(self.connection_pool, debuglevel=debuglevel)
+		https_handler = KeepAliveHTTPSHandler(self.connection_pool, debuglevel=debuglevel, context=context)
 		self.opener = build_opener(http_handler, https_handler)
 		self.no_redirects_opener = build_opener(NoRedirects, http_handler, https_handler)
 
 	# Send an HTTP HEAD request
 	def head(self, url):
-		return self.request(url, method="HEAD")
+		if self.cassette is None:
+			return self.request(url, method="HEAD")
+		key = f"HEAD {url}"
+		if self.cassette.replaying:
+			return self.cassette.replay_response(key)
+		try:
+			response = self.request(url, method="HEAD")
+		except HTTPError as e:
+			self.cassette.record(key, url, None, e, b"")
+			raise
+		self.cassette.record(key, url, None, response, b"")
+		return response
 
 	# Send an HTTP GET request
 	def get(self, url, **kwargs):
 		return self.request(url, method="GET", **kwargs)
 
 	# Send an HTTP request
-	def request(self, url, query=None, accept="text/html, */*", follow_redirects=True, method="GET"):
-		left_to_wait = (self.min_request_interval - (time() - self.last_request_time))
-		if left_to_wait > 0:
-			sleep(left_to_wait)
+	def request(self, url, query=None, accept="text/html, */*", follow_redirects=True, method="GET", headers=None):
 		if query:
 			url = url + '?' + urlencode(query)
+		self.rate_limiter.wait(urlparse(url).hostname)
 		logger.debug("Fetching %s...", unquote(url))
 		request = Request(
 			url,
@@ -132,6 +222,7 @@ class Fetcher:
 				"Accept-Encoding": "gzip",
 				"Accept-Language": "en-US",
 				"User-Agent": self.user_agent,
+				**(headers or {}),
 				},
 			method = method,
 			)
@@ -141,52 +232,328 @@ class Fetcher:
 			response = self.no_redirects_opener.open(request, timeout=self.request_timeout)
 		if response.headers.get("Content-Encoding") == "gzip":
 			response = GzipResponseWrapper(response)
-		self.last_request_time = time()
+		self.connection_pool.log_stats()
 		return response
 
 	# Send an HTTP GET request and parse the result as HTML.
 	def get_html(self, url, query=None):
-		response = self.get(url, query=query)
-		return lxml.html.parse(response).getroot()
+		body = self.get_body(url, query=query)
+		return lxml.html.parse(BytesIO(body)).getroot()
 
 	# Send an HTTP GET request and parse the result as JSON
 	def get_json(self, url, query=None):
-		response = self.get(url, query=query, accept="application/json")
-		return json.load(response)
+		body = self.get_body(url, query=query, accept="application/json")
+		return json.loads(body)
+
+	# Send an HTTP GET request and return the body of the response. If the
+	# HTTP cache is enabled, use the cached copy if it is still fresh. If it
+	# is stale, ask the server whether it has changed. A 304 Not Modified
+	# response does not count against the host's rate limit.
+	@tracer.traced("GET", "url", result=lambda body: {"bytes": len(body)})
+	def get_body(self, url, query=None, accept="text/html, */*"):
+		if query:
+			url = url + '?' + urlencode(query)
+		key = f"{accept} {url}"
+
+		# When recording or replaying a cassette we bypass the HTTP cache
+		# so that each response is real or comes from the cassette.
+		if self.cassette is not None:
+			if self.cassette.replaying:
+				return self.cassette.replay(key)
+			try:
+				response = self.get(url, accept=accept)
+			except HTTPError as e:
+				# Error responses do not pass through request()'s decoding
+				body = (GzipResponseWrapper(e) if e.headers.get("Content-Encoding") == "gzip" else e).read()
+				self.cassette.record(key, url, accept, e, body)
+				raise
+			body = response.read()
+			self.cassette.record(key, url, accept, response, body)
+			return body
+
+		if self.http_cache is None:
+			return self.get(url, accept=accept).read()
+
+		entry = self.http_cache.lookup(key)
+		if entry is not None:
+			if entry.is_fresh():
+				logger.debug("HTTP cache hit: %s", unquote(url))
+				self.http_cache.hits += 1
+				self.http_cache.touch(entry)
+				return entry.read_body()
+			try:
+				response = self.get(url, accept=accept, headers=entry.conditional_headers())
+			except HTTPError as e:
+				if e.code != 304:
+					raise
+				logger.debug("HTTP cache revalidated: %s", unquote(url))
+				self.rate_limiter.refund(urlparse(url).hostname)
+				self.http_cache.revalidations += 1
+				self.http_cache.touch(entry, e.headers)
+				return entry.read_body()
+		else:
+			response = self.get(url, accept=accept)
+
+		self.http_cache.misses += 1
+		body = response.read()
+		self.http_cache.store(key, url, response.headers, body)
+		return body
 
 	# Download a video or picture from a URL, store it in the cache
 	# directory, and return its path.
+	#
+	# While the download is in progress the data goes into cachefile.tmp and
+	# the validators needed to resume it go into cachefile.tmp.json. If a
+	# download is interrupted, the next attempt asks the server only for the
+	# part we do not yet have.
+	#
+	# If download_segments is greater than one, large files are split into
+	# that many byte ranges which are downloaded at the same time.
+	@tracer.traced("download", "url", result=lambda path: {"bytes": os.path.getsize(path)})
 	def download_media(self, url:str, cachefile:str=None, callback=None):
+
+		# Already on disk (for example, a picture copied out of an EPUB)
+		if url.startswith("file:"):
+			path = os.path.abspath(url2pathname(urlparse(url).path))
+			if not os.path.exists(path):
+				raise FetcherError("File is no longer in the cache: %s" % path)
+			return path
+
 		if cachefile is None:
 			if self.cachedir is None:
 				raise FetcherError("Cachedir is not set")
 			cachefile = os.path.join(self.cachedir, os.path.basename(urlparse(url).path))
+
+		# If another thread is downloading the same file, wait for it to finish
+		with self.download_locks_lock:
+			lock = self.download_locks.get(os.path.abspath(cachefile))
+			if lock is None:
+				lock = self.download_locks[os.path.abspath(cachefile)] = Lock()
+		with lock:
+			return self.download_to_cachefile(url, cachefile, callback)
+
+	def download_to_cachefile(self, url:str, cachefile:str, callback):
 		if not os.path.exists(cachefile):
-			response = self.get(url)
-			assert response.status == 200, response.status
-			total_expected = response.headers.get("Content-Length")
-			if total_expected is not None:		# PDF files observed to lack
-				total_expected = int(total_expected)
-			else:
-				logger.warning("%s has no Content-Length")
-			with open(cachefile + ".tmp", "wb") as fh:
-				total_recv = 0
-				last_callback = 0
-				while True:
-					chunk = response.read(0x10000)	# 64k
+			tmpfile = cachefile + ".tmp"
+			state = self.load_download_state(url, tmpfile)
+
+			# A segmented download is resumed segment by segment
+			if state is not None and state.get("segments") is not None:
+				logger.debug("Resuming segmented download of %s", unquote(url))
+				self.receive_segments(url, tmpfile, state, None, callback)
+				self.finish_download(tmpfile, cachefile)
+				return os.path.abspath(cachefile)
+
+			offset = state["received"] if state is not None else 0
+
+			# If we have part of the file, ask for the rest, but only if the file has
+			# not changed on the server. If it has, the server will send all of it.
+			headers = {"Accept-Encoding": "identity"}
+			if offset > 0:
+				logger.debug("Resuming download of %s at byte %d", unquote(url), offset)
+				headers["Range"] = "bytes=%d-" % offset
+				headers["If-Range"] = state["validator"]
+			try:
+				response = self.get(url, headers=headers)
+			except HTTPError as e:
+				if e.code != 416:
+					raise
+				# Range not satisfiable. Perhaps we have the whole file already.
+				m = re.match(r"^bytes \*/(\d+)$", e.headers.get("Content-Range",""))
+				if m is None or int(m.group(1)) != offset:
+					os.unlink(tmpfile)
+					raise
+				response = None
+
+			if response is not None:
+				if response.status == 206 and offset > 0:
+					m = re.match(r"^bytes (\d+)-(\d+)/(\d+|\*)$", response.headers.get("Content-Range",""))
+					assert m is not None and int(m.group(1)) == offset, "Bad Content-Range: %s" % response.headers.get("Content-Range")
+					total_expected = int(m.group(3)) if m.group(3) != "*" else None
+				else:
+					assert response.status == 200, response.status
+					if offset > 0:
+						logger.debug("Server sent the whole file, restarting download")
+					offset = 0
+					total_expected = response.headers.get("Content-Length")
+					if total_expected is not None:		# PDF files observed to lack
+						total_expected = int(total_expected)
+					else:
+						logger.warning("%s has no Content-Length", unquote(url))
+					state = self.save_download_state(url, tmpfile, response.headers, total_expected)
+
+				if offset == 0 and self.can_segment(response, state):
+					self.receive_segments(url, tmpfile, state, response, callback)
+				else:
+					self.receive_download(response, tmpfile, offset, total_expected, callback)
+
+			self.finish_download(tmpfile, cachefile)
+		return os.path.abspath(cachefile)
+
+	def finish_download(self, tmpfile, cachefile):
+		os.rename(tmpfile, cachefile)
+		os.unlink(tmpfile + ".json")
+
+	# Copy the response body to the end of the partially downloaded file
+	def receive_download(self, response, tmpfile, offset, total_expected, callback):
+		with open(tmpfile, "ab" if offset > 0 else "wb") as fh:
+			total_recv = offset
+			last_callback = 0
+			while True:
+				chunk = response.read(0x10000)	# 64k
+				if not chunk:
+					break
+				fh.write(chunk)
+				total_recv += len(chunk)
+				logger.debug("%d byte chunk, %s of %s bytes received", len(chunk), total_recv, total_expected)
+				if callback and total_expected is not None:
+					now = time()
+					if (now - last_callback) >= 0.5 or total_recv == total_expected:
+						callback("{total_recv} of {total_expected}", total_recv=total_recv, total_expected=total_expected)
+						last_callback = now
+		if total_expected is not None and total_recv != total_expected:
+			raise FetcherError("Download incomplete: %d of %d bytes received" % (total_recv, total_expected))
+		logger.debug("Media file downloaded, %d bytes received", total_recv - offset)
+
+	# Should we download this file in several pieces at once?
+	def can_segment(self, response, state):
+		return self.download_segments > 1 \
+			and state["total"] is not None \
+			and state["total"] >= self.segmented_download_threshold \
+			and state["validator"] is not None \
+			and response.headers.get("Accept-Ranges") == "bytes"
+
+	# Download the file in segments using several threads. Each thread
+	# writes its byte range at the corresponding offset in the tmpfile.
+	# If response is supplied, it is the start of the file and is used
+	# for the first segment.
+	def receive_segments(self, url, tmpfile, state, response, callback):
+		total_expected = state["total"]
+		if state.get("segments") is None:
+			segment_size = -(-total_expected // self.download_segments)
+			state["segments"] = [
+				[start, min(start + segment_size, total_expected) - 1, 0]
+				for start in range(0, total_expected, segment_size)
+				]
+			with open(tmpfile, "wb") as fh:
+				fh.truncate(total_expected)
+			self.write_download_state(tmpfile, state)
+		segments = state["segments"]
+		logger.debug("Downloading %s in %d segments", unquote(url), len(segments))
+
+		def fetch_segment(segment, response):
+			start, end, received = segment
+			if received > end - start:
+				return
+			if response is None:
+				response = self.get(url, headers = {
+					"Accept-Encoding": "identity",
+					"Range": "bytes=%d-%d" % (start + received, end),
+					"If-Range": state["validator"],
+					})
+				if response.status != 206:
+					response.close()
+					raise FetcherChangedError("Server did not honor range request for %s" % unquote(url))
+			# Unbuffered so that what is counted as received has been handed
+			# to the operating system
+			with open(tmpfile, "r+b", buffering=0) as fh:
+				fh.seek(start + received)
+				remaining = end - start + 1 - received
+				while remaining > 0:
+					chunk = response.read(min(0x10000, remaining))
 					if not chunk:
 						break
-					fh.write(chunk)
-					total_recv += len(chunk)
-					logger.debug("%d byte chunk, %s of %s bytes received", len(chunk), total_recv, total_expected)
-					if callback and total_expected is not None:
-						now = time()
-						if (now - last_callback) >= 0.5 or total_recv == total_expected:
-							callback("{total_recv} of {total_expected}", total_recv=total_recv, total_expected=total_expected)
-							last_callback = now
-			os.rename(cachefile + ".tmp", cachefile)
-			logger.debug("Media file downloaded, %d bytes received", total_recv)
-		return os.path.abspath(cachefile)
+					view = memoryview(chunk)
+					while view:
+						written = fh.write(view)
+						view = view[written:]
+						remaining -= written
+						segment[2] += written
+			response.close()
+			if remaining > 0:
+				raise FetcherError("Segment %d-%d of %s incomplete" % (start, end, unquote(url)))
+
+		# Save the progress of each segment. The counts are copied first and
+		# the file is flushed to disk before they are saved so that we never
+		# record bytes as received which a power failure could lose.
+		def save_progress():
+			snapshot = dict(state, segments=[list(segment) for segment in segments])
+			with open(tmpfile, "r+b") as fh:
+				os.fsync(fh.fileno())
+			self.write_download_state(tmpfile, snapshot)
+
+		# Progress is reported from this thread since the callback may
+		# depend on the context of the thread which called us.
+		try:
+			with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+				futures = [
+					executor.submit(fetch_segment, segment, response if i == 0 else None)
+					for i, segment in enumerate(segments)
+					]
+				not_done = futures
+				last_saved = time()
+				while not_done:
+					done, not_done = wait(not_done, timeout=0.5)
+					if not_done and time() - last_saved >= self.download_state_interval:
+						save_progress()
+						last_saved = time()
+					if callback:
+						total_recv = sum(segment[2] for segment in segments)
+						callback("{total_recv} of {total_expected}", total_recv=total_recv, total_expected=total_expected)
+				for future in futures:
+					future.result()
+		except FetcherChangedError:
+			os.unlink(tmpfile)
+			os.unlink(tmpfile + ".json")
+			raise
+		finally:
+			if os.path.exists(tmpfile):
+				save_progress()
+
+		total_recv = sum(segment[2] for segment in segments)
+		if total_recv != total_expected or os.path.getsize(tmpfile) != total_expected:
+			raise FetcherError("Download incomplete: %d of %d bytes received" % (total_recv, total_expected))
+		logger.debug("Media file downloaded in %d segments, %d bytes", len(segments), total_recv)
+
+	# Record what we need to know to resume a download of this file later
+	def save_download_state(self, url, tmpfile, headers, total_expected):
+		state = {
+			"url": url,
+			"etag": headers.get("ETag"),
+			"last_modified": headers.get("Last-Modified"),
+			"total": total_expected,
+			}
+		self.write_download_state(tmpfile, state)
+		state["received"] = 0
+		state["validator"] = self.download_validator(state)
+		return state
+
+	def write_download_state(self, tmpfile, state):
+		state = {name: state.get(name) for name in ("url", "etag", "last_modified", "total", "segments")}
+		with open(tmpfile + ".json.tmp", "w") as fh:
+			json.dump(state, fh)
+		os.replace(tmpfile + ".json.tmp", tmpfile + ".json")
+
+	# If a previous attempt to download this URL was interrupted, return the
+	# state saved by save_download_state() with the number of bytes received.
+	def load_download_state(self, url, tmpfile):
+		try:
+			with open(tmpfile + ".json") as fh:
+				state = json.load(fh)
+			state["received"] = os.path.getsize(tmpfile)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return None
+		state["validator"] = self.download_validator(state)
+		if state["url"] != url or state["validator"] is None:
+			return None
+		return state
+
+	# Value for If-Range. A weak ETag may not be used.
+	@staticmethod
+	def download_validator(state):
+		if state["etag"] is not None and not state["etag"].startswith("W/"):
+			return state["etag"]
+		return state["last_modified"]
 
 	#======================================================================
 	# For debugging
@@ -195,14 +562,24 @@ class Fetcher:
 	# Pretty print a parsed HTML element and its children. We need this because
 	# in a browser JavaScript code transforms the page a bit after it is loaded,
 	# so we can't completely trust what we seen in the browser's debugger.
-	def dump_html(self, el, filename=None):
-		self.indent_html(el)
-		text = lxml.html.tostring(el, encoding="UNICODE")
+	#
+	# If a filename is given, the dump is always written. Otherwise nothing
+	# is done unless debug_dump_level is at least level. Pretty printing is
+	# slow, so it is put off until the text is actually needed.
+	def dump_html(self, el, filename=None, level=1):
 		if filename:
 			with open(filename, "w") as fh:
-				fh.write(text)
-		else:
-			logger.debug("=======================================================\n%s", text)
+				fh.write(self.html_text(el))
+		elif self.debug_dump_level >= level:
+			self.debug_dump(LazyText(self.html_text, el), "html")
+
+	# Serialize an element with its tags indented. It is copied first since
+	# indent_html() changes the whitespace and that would change the text
+	# which the extractors see.
+	def html_text(self, el):
+		el = deepcopy(el)
+		self.indent_html(el)
+		return lxml.html.tostring(el, encoding="UNICODE")
 
 	# Alter the whitespace in the element tree to indent the tags
 	# https://web.archive.org/web/20200130163816/http://effbot.org/zone/element-lib.htm#prettyprint
@@ -221,10 +598,27 @@ class Fetcher:
 			if level and (not elem.tail or not elem.tail.strip()):
 				elem.tail = i
 
-	@staticmethod
-	def dump_json(data):
-		text = json.dumps(data, indent=4, ensure_ascii=False)
-		logger.debug("=======================================================\n%s", text)
+	# Pretty print data loaded from a JSON API
+	def dump_json(self, data, level=1):
+		if self.debug_dump_level >= level:
+			self.debug_dump(LazyText(json.dumps, data, indent=4, ensure_ascii=False), "json")
+
+	# Send a dump to the log or, if debug_dump_dir is set, to a numbered
+	# file there, removing the oldest files beyond debug_dump_keep.
+	@classmethod
+	def debug_dump(cls, text, extension):
+		if cls.debug_dump_dir is None:
+			logger.debug("=======================================================\n%s", text)
+			return
+		with cls.debug_dump_lock:
+			os.makedirs(cls.debug_dump_dir, exist_ok=True)
+			filename = os.path.join(cls.debug_dump_dir, "%d-%06d.%s" % (time(), next(cls.debug_dump_counter), extension))
+			with open(filename, "w") as fh:
+				fh.write(str(text))
+			old_files = sorted(os.listdir(cls.debug_dump_dir))
+			for old_file in old_files[:-cls.debug_dump_keep]:
+				os.unlink(os.path.join(cls.debug_dump_dir, old_file))
+		logger.debug("Dumped to %s", filename)
 
 	#======================================================================
 	# The Pub Media API is used to find:
@@ -239,7 +633,7 @@ class Fetcher:
 			"output": "json",
 			"fileformat": query.get("fileformat", "m4v,mp4,3gp,mp3"),
 			"alllangs": "0",		# 1 observed, use 0 because we don't need all the languages
-			"langwritten": self.meps_language,
+			"langwritten": query.get("langwritten", self.meps_language),
 			"txtCMSLang": self.meps_language,
 			}
 		if query.get("pub") is not None:
@@ -266,6 +660,118 @@ class Fetcher:
 			return None
 		return media["files"][self.meps_language]["EPUB"][0]["file"]["url"]
 
+	# Get an index of the videos in a publication issue (or in a publication
+	# without issues such as the songbook) from the Pub Media API. One request
+	# gets all the tracks, so the metadata of the videos linked from a meeting
+	# article can usually be looked up here rather than one by one.
+	# Returns a dict with two indexes of the same entries: "tracks" keyed
+	# by track number and "docids" keyed by MEPS document ID (both strings).
+	def get_pub_media_manifest(self, pub:str, issue:str, meps_language:str):
+		key = (pub, issue, meps_language)
+
+		# Take the memoized manifest or, if there is none, become the thread
+		# which loads it. If another thread is already loading it, wait for it.
+		while True:
+			with self.manifest_memo_lock:
+				memo = self.manifest_memo.get(key)
+				if memo is not None and (monotonic() - memo[0]) < self.manifest_memo_ttl:
+					break
+				loading = self.manifest_loading.get(key)
+				if loading is None:
+					loading = self.manifest_loading[key] = Lock()
+					loading.acquire()
+					memo = None
+					break
+			with loading:
+				pass
+
+		if memo is None:
+			try:
+				tracks = self.load_pub_media_manifest(pub, issue, meps_language)
+				docids = {str(entry["docid"]): entry for entry in tracks.values() if entry["docid"]}
+				memo = (monotonic(), {"tracks": tracks, "docids": docids}, None)
+			except FetcherNoMediaError as e:
+				memo = (monotonic(), None, str(e))
+			finally:
+				with self.manifest_memo_lock:
+					if memo is not None:
+						now = monotonic()
+						for stale in [k for k, v in self.manifest_memo.items() if (now - v[0]) >= self.manifest_memo_ttl]:
+							del self.manifest_memo[stale]
+						self.manifest_memo[key] = memo
+					del self.manifest_loading[key]
+				loading.release()
+
+		loaded, index, error = memo
+		if error is not None:
+			raise FetcherNoMediaError(error)
+		return index
+
+	# Look for a video by MEPS document ID in the manifests which this
+	# process has already loaded. Returns the manifest entry or None.
+	def find_in_pub_media_manifests(self, docid, meps_language:str):
+		now = monotonic()
+		with self.manifest_memo_lock:
+			for (pub, issue, language), (loaded, index, error) in self.manifest_memo.items():
+				if language == meps_language and index is not None and (now - loaded) < self.manifest_memo_ttl:
+					entry = index["docids"].get(str(docid))
+					if entry is not None:
+						return entry
+		return None
+
+	# Fetch the manifest from the metadata cache or the Pub Media API.
+	# Returns a dict keyed by track number (as a string).
+	def load_pub_media_manifest(self, pub:str, issue:str, meps_language:str):
+		def fetch():
+			try:
+				media = self.get_pub_media({
+					"pub": pub,
+					"issue": issue,
+					"fileformat": "MP4",
+					"langwritten": meps_language,
+					})
+			except HTTPError as e:
+				if e.code != 404:
+					raise
+				raise FetcherNoMediaError("No Pub Media manifest for %s %s" % (pub, issue))
+			manifest = {}
+			for variant in media.get("files", {}).get(meps_language, {}).get("MP4", []):
+				track = manifest.setdefault(str(variant["track"]), {
+					"title": variant["title"],
+					"docid": variant.get("docid"),
+					"thumbnail_url": variant.get("trackImage", {}).get("url") or None,
+					"subtitles_url": variant["subtitles"]["url"] if "subtitles" in variant else None,
+					"files": {},
+					})
+				track["files"][variant["label"]] = variant["file"]["url"]
+			if len(manifest) == 0:
+				raise FetcherNoMediaError("Empty Pub Media manifest for %s %s" % (pub, issue))
+			return manifest
+		return self.get_media_record(f"manifest:{pub}:{issue}:{meps_language}", fetch)
+
+	# Look up a video in the manifest of its publication. Returns the same
+	# dict as .get_video_metadata() or None if the caller should ask about
+	# this video individually.
+	def get_video_metadata_from_manifest(self, pub:str, issue:str, track, resolution:str, meps_language:str):
+		try:
+			manifest = self.get_pub_media_manifest(pub, issue, meps_language)
+		except FetcherNoMediaError as e:
+			logger.debug("%s", e)
+			return None
+		return self.manifest_entry_metadata(manifest["tracks"].get(str(track)), resolution)
+
+	# Convert a manifest entry to the dict returned by .get_video_metadata().
+	# Returns None if there is no entry or it lacks a thumbnail.
+	def manifest_entry_metadata(self, entry:dict, resolution:str):
+		if entry is None or entry["thumbnail_url"] is None:
+			return None
+		return {
+			"title": entry["title"],
+			"url": entry["files"].get(resolution) if resolution is not None else None,
+			"thumbnail_url": entry["thumbnail_url"],
+			"subtitles_url": entry["subtitles_url"],
+			}
+
 	#======================================================================
 	# Given the URL of a video on JW.ORG, get its metadata and
 	# optionally, the URL of the MP4 file
@@ -276,7 +782,7 @@ class Fetcher:
 	# * resolution (optional) -- "240p", "360p", "480p", or "720p"
 	# * language -- optional language override, ISO code
 	# Return None if this does not appear to be a link to a video on JW.ORG.
-	@cache
+	@tracer.traced("video metadata", "url", "language")
 	def get_video_metadata(self, url:str, resolution:int=None, language:str=None):
 		assert isinstance(url, str)
 
@@ -298,13 +804,21 @@ class Fetcher:
 			# MWB for week of February 15, 2026 has a weird lank
 			lank = re.sub(r"_x_VIDEO$", "_1_VIDEO", lank)
 
-			media = self.get_json(self.mediator_items_url.format(
-				meps_language = meps_language,
-				video = lank,
-				), query = { "clientType": "www" })
-			if len(media["media"]) < 1:
-				raise FetcherNoMediaError("Video not yet available: %s" % url)
-			media = media["media"][0]
+			# If the lank identifies a track in a publication, try the manifest first.
+			if (m := patterns.lank_pub_track.match(lank)) is not None:
+				metadata = self.get_video_metadata_from_manifest(m.group(1), m.group(2), int(m.group(3)), resolution, meps_language)
+				if metadata is not None:
+					return metadata
+
+			def fetch():
+				media = self.get_json(self.mediator_items_url.format(
+					meps_language = meps_language,
+					video = lank,
+					), query = { "clientType": "www" })
+				if len(media["media"]) < 1:
+					raise FetcherNoMediaError("Video not yet available: %s" % url)
+				return media["media"][0]
+			media = self.get_media_record(f"lank:{lank}:{meps_language}", fetch)
 
 			# If the caller has specified a video resolution, find a suitable file.
 			mp4_url = None
@@ -338,22 +852,33 @@ class Fetcher:
 
 			# Video specified by publication and track
 			if "pub" in query:
+				metadata = self.get_video_metadata_from_manifest(query["pub"], query.get("issue"), query["track"], resolution, meps_language)
+				if metadata is not None:
+					return metadata
 				params = {
 					"pub": query["pub"],
 					"track": query["track"],
 					}
+				key = f"pub:{query['pub']}:track:{query['track']}:{meps_language}"
 
 			# Video is specified by its MEPS Document ID
 			else:
+				metadata = self.manifest_entry_metadata(self.find_in_pub_media_manifests(query["docid"], meps_language), resolution)
+				if metadata is not None:
+					return metadata
 				params = {
 					"docid": query["docid"],
 					}
 				assert "track" not in query
+				key = f"docid:{query['docid']}:{meps_language}"
 
-			media = self.get_pub_media(params)
-			self.dump_json(media)
+			def fetch():
+				media = self.get_pub_media(params)
+				self.dump_json(media)
+				return media["files"][meps_language]
+			files = self.get_media_record(key, fetch)
 
-			mp4 = media["files"][meps_language].get("MP4")
+			mp4 = files.get("MP4")
 			if mp4 is None:
 				logger.info("No video files")
 				return None
@@ -382,6 +907,27 @@ class Fetcher:
 		logger.info("Not a share URL: %s", unquote(url))
 		return None
 
+	# Get a media record from the metadata cache or, if it is not there,
+	# by calling fetch() and save it in the cache. FetcherNoMediaError
+	# is cached too, but for a shorter time.
+	def get_media_record(self, key:str, fetch):
+		if self.metadata_cache is None or self.cassette is not None:
+			return fetch()
+		cached = self.metadata_cache.lookup(key)
+		if cached is not None:
+			logger.debug("Metadata cache hit: %s", key)
+			record, error = cached
+			if error is not None:
+				raise FetcherNoMediaError(error)
+			return record
+		try:
+			record = fetch()
+		except FetcherNoMediaError as e:
+			self.metadata_cache.store_error(key, str(e))
+			raise
+		self.metadata_cache.store(key, record)
+		return record
+
 	# We have split out the URL parsing so we an use return.
 	#
 	# The March 2018 MWB is the first to link to the sample presentation videos:
@@ -1,16 +1,18 @@
 from lxml import etree as ET
-import re
+from bisect import bisect_left, bisect_right
 import logging
 
 from .article import Article
+from . import patterns
 
 logger = logging.getLogger(__name__)
 
 class RangeFigure:
-	def __init__(self, pnum, el):
+	def __init__(self, pnum, el, order):
 		self.id = el.attrib["id"]
 		self.pnum = pnum
 		self.el = el
+		self.order = order		# position in document
 	def print(self):
 		alt = self.el.xpath(".//img")[0].attrib.get("alt")
 		print(f"<RangeFigure id={self.id} pnum={self.pnum} alt={repr(alt[:50])}>")
@@ -50,6 +52,7 @@ class HighlightRange:
 
 	def __init__(self, article:Article):
 		assert isinstance(article, Article)
+		self.article = article
 		self.top_image = article.main_tag.find(".//figure[@id='articleTopRelatedImage']")
 
 		context = ET.iterwalk(article.article_tag, events={"start", "end"}, tag={"h1","h2","h3","h4","h5", "h6", "div", "p"})
@@ -60,13 +63,15 @@ class HighlightRange:
 		for action, el in context:
 			id = el.attrib.get("id", "")
 			classes = set(el.attrib.get("class","").split(" "))
+			id_match = patterns.paragraph_or_figure_id.match(id)
+			id_type = id_match.group(1) if id_match is not None else None
 
 			if action == "start":
 
 				# Paragraph
-				if m := re.match(r"p(\d+)$", id):
+				if id_type == "p":
 					if not (classes & self.excluded_paragraph_types):
-						last_pnum = int(m.group(1))
+						last_pnum = int(id_match.group(2))
 						if first_pnum is None:
 							first_pnum = last_pnum
 						self.sweep_figures(last_pnum, "next")
@@ -74,7 +79,7 @@ class HighlightRange:
 					context.skip_subtree()
 
 				# Figure
-				elif re.match(r"f\d+$", id):
+				elif id_type == "f":
 					if classes & self.following_figure_classes:		# connected to previous paragraph
 						figure_pnum = last_pnum
 					elif classes & self.leading_figure_classes:		# connected to next paragraph
@@ -82,7 +87,7 @@ class HighlightRange:
 					else:											# connected to first paragraph in paragraph group container
 						figure_pnum = "neighbor"
 					#print(f"figure {id} {figure_pnum}")
-					self.figures.append(RangeFigure(figure_pnum, el))
+					self.figures.append(RangeFigure(figure_pnum, el, len(self.figures)))
 					context.skip_subtree()
 
 				elif classes & self.pgroup_classes:
@@ -97,9 +102,7 @@ class HighlightRange:
 					first_pnum = last_pnum = None
 
 			elif action == "end":
-				if re.match(r"p(\d+)$", id):
-					pass
-				elif re.match(r"f\d+$", id):
+				if id_type is not None:
 					pass
 				elif classes & self.pgroup_classes:
 					#print(f"end of pgroup {el.tag} {id} first_pnum={first_pnum} last_pnum={last_pnum}")
@@ -119,6 +122,13 @@ class HighlightRange:
 			if type(figure.pnum) is str:
 				figure.pnum = 0
 
+		# Index the figures by paragraph number for range_figures()
+		self.figures_by_pnum = sorted(self.figures, key=lambda figure: (figure.pnum, figure.order))
+		self.pnums = [figure.pnum for figure in self.figures_by_pnum]
+
+	# Assign a paragraph number to the figures at the end of the list which
+	# are waiting for one. Since we stop at the first figure which is not
+	# waiting, each figure is visited only once while waiting.
 	def sweep_figures(self, pnum, placeholder):
 		#print(f"sweep_figures({pnum}, {placeholder})")
 		assert pnum is not None
@@ -132,7 +142,7 @@ class HighlightRange:
 		for figure in self.figures:
 			figure.print()
 
+	# Return the figures attached to paragraphs start through end in document order
 	def range_figures(self, start, end):
-		for figure in self.figures:
-			if start <= figure.pnum <= end:
-				yield figure
+		figures = self.figures_by_pnum[bisect_left(self.pnums, start):bisect_right(self.pnums, end)]
+		return sorted(figures, key=lambda figure: figure.order)
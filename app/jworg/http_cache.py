@@ -0,0 +1,243 @@
+# On-disk cache of HTTP responses for Fetcher.get_html() and .get_json()
+#
+# Each entry is stored as two files named with the SHA-1 hash of the cache key:
+# * <hash>.json -- URL, validators (ETag, Last-Modified), and freshness information
+# * <hash>.body -- the response body (after removal of gzip encoding)
+#
+# The modification time of the .json file is updated on every hit so that
+# we can evict the least-recently-used entries when the total size of the
+# cache exceeds its cap.
+#
+# The counts of hits, revalidations, and misses are kept in memory and
+# added to the totals in the file "statistics" when the process exits, so
+# that "flask cache http-status" can show them.
+
+import os, json, atexit
+from hashlib import sha1
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class HttpCacheEntry:
+	def __init__(self, path, metadata):
+		self.path = path
+		self.metadata = metadata
+
+	@property
+	def url(self):
+		return self.metadata["url"]
+
+	@property
+	def size(self):
+		return self.metadata["size"]
+
+	@property
+	def stored(self):
+		return self.metadata["stored"]
+
+	@property
+	def expires(self):
+		return self.metadata.get("expires")
+
+	# Can we use this entry without asking the server?
+	def is_fresh(self):
+		return self.expires is not None and time() < self.expires
+
+	# Headers to send to the server to ask whether our copy is still good
+	def conditional_headers(self):
+		headers = {}
+		if (etag := self.metadata.get("etag")) is not None:
+			headers["If-None-Match"] = etag
+		if (last_modified := self.metadata.get("last_modified")) is not None:
+			headers["If-Modified-Since"] = last_modified
+		return headers
+
+	def read_body(self):
+		with open(self.path + ".body", "rb") as fh:
+			return fh.read()
+
+class HttpCache:
+	counters = ("hits", "revalidations", "misses")
+
+	def __init__(self, cachedir, max_size=64*1024*1024):
+		self.cachedir = cachedir
+		self.max_size = max_size
+		self.lock = Lock()
+		self.hits = 0
+		self.revalidations = 0
+		self.misses = 0
+		self.saved_counts = dict.fromkeys(self.counters, 0)		# counts already added to the statistics file
+		self.total_size = None		# computed on first store
+		self.stats_file = os.path.join(self.cachedir, "statistics")
+		os.makedirs(self.cachedir, exist_ok=True)
+		atexit.register(self.save_stats)
+
+	def _path(self, key):
+		return os.path.join(self.cachedir, sha1(key.encode("utf-8")).hexdigest())
+
+	# Return the HttpCacheEntry for this key or None if we have not seen it.
+	def lookup(self, key):
+		path = self._path(key)
+		try:
+			with open(path + ".json") as fh:
+				metadata = json.load(fh)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return None
+		if metadata.get("key") != key or not os.path.exists(path + ".body"):
+			return None
+		return HttpCacheEntry(path, metadata)
+
+	# Mark an entry as recently used and, if the server has revalidated it,
+	# update its freshness information.
+	def touch(self, entry, headers=None):
+		if headers is not None:
+			entry.metadata.update(self._freshness(headers, entry.metadata))
+			self._write_metadata(entry.path, entry.metadata)
+		else:
+			try:
+				os.utime(entry.path + ".json")
+			except FileNotFoundError:
+				pass
+
+	# Save a response body in the cache if the server permits it.
+	def store(self, key, url, headers, body):
+		cache_control = self._cache_control(headers)
+		if "no-store" in cache_control:
+			return
+		path = self._path(key)
+		metadata = {
+			"key": key,
+			"url": url,
+			"size": len(body),
+			"stored": time(),
+			"content_type": headers.get("Content-Type"),
+			"etag": headers.get("ETag"),
+			"last_modified": headers.get("Last-Modified"),
+			}
+		metadata.update(self._freshness(headers, metadata))
+		with self.lock:
+			if self.total_size is None:
+				self.total_size = sum(entry.size for entry in self.entries())
+			old = self.lookup(key)
+			with open(path + ".body.tmp", "wb") as fh:
+				fh.write(body)
+			os.replace(path + ".body.tmp", path + ".body")
+			self._write_metadata(path, metadata)
+			self.total_size += len(body) - (old.size if old is not None else 0)
+			if self.total_size > self.max_size:
+				self._evict()
+
+	def _write_metadata(self, path, metadata):
+		with open(path + ".json.tmp", "w") as fh:
+			json.dump(metadata, fh)
+		os.replace(path + ".json.tmp", path + ".json")
+
+	# Work out from the response headers until when we may use this response
+	# without revalidating it with the server.
+	def _freshness(self, headers, metadata):
+		cache_control = self._cache_control(headers)
+		now = time()
+		expires = None
+		if "no-cache" in cache_control:
+			pass
+		elif "max-age" in cache_control:
+			try:
+				expires = now + int(cache_control["max-age"]) - int(headers.get("Age", 0))
+			except ValueError:
+				pass
+		elif (expires_header := headers.get("Expires")) is not None:
+			try:
+				expires = parsedate_to_datetime(expires_header).timestamp()
+			except (TypeError, ValueError):
+				pass
+		# Heuristic freshness (RFC 9111 section 4.2.2): 10% of the time since last modification
+		elif (last_modified := metadata.get("last_modified")) is not None:
+			try:
+				age = now - parsedate_to_datetime(last_modified).timestamp()
+				expires = now + min(age / 10, 86400)
+			except (TypeError, ValueError):
+				pass
+		return {"expires": expires}
+
+	@staticmethod
+	def _cache_control(headers):
+		result = {}
+		for directive in (headers.get("Cache-Control") or "").split(","):
+			name, _, value = directive.strip().partition("=")
+			if name:
+				result[name.lower()] = value.strip('"')
+		return result
+
+	# Remove least-recently-used entries until we are under the size cap.
+	def _evict(self):
+		entries = sorted(self.entries(), key=lambda entry: entry.mtime)
+		for entry in entries:
+			if self.total_size <= self.max_size:
+				break
+			logger.debug("Evicting %s from HTTP cache", entry.url)
+			self._remove(entry.path)
+			self.total_size -= entry.size
+
+	def _remove(self, path):
+		for ext in (".json", ".body"):
+			try:
+				os.unlink(path + ext)
+			except FileNotFoundError:
+				pass
+
+	# Iterate over all the entries in the cache
+	def entries(self):
+		for dirent in os.scandir(self.cachedir):
+			if dirent.name.endswith(".json"):
+				try:
+					with open(dirent.path) as fh:
+						metadata = json.load(fh)
+					entry = HttpCacheEntry(dirent.path[:-5], metadata)
+					entry.mtime = dirent.stat().st_mtime
+				except (FileNotFoundError, json.JSONDecodeError):
+					continue
+				yield entry
+
+	# Remove all entries and the statistics
+	def clear(self):
+		with self.lock:
+			for dirent in os.scandir(self.cachedir):
+				if dirent.is_file() and dirent.name.endswith((".json", ".body", ".tmp")):
+					os.unlink(dirent.path)
+			self._remove_stats()
+			self.total_size = 0
+
+	# Counts of hits, revalidations, and misses since the cache was cleared,
+	# including those of this process
+	def stats(self):
+		try:
+			with open(self.stats_file) as fh:
+				saved = json.load(fh)
+		except (FileNotFoundError, json.JSONDecodeError):
+			saved = {}
+		return {name: saved.get(name, 0) + getattr(self, name) - self.saved_counts[name] for name in self.counters}
+
+	# Add this process's counts to the totals in the statistics file
+	def save_stats(self):
+		with self.lock:
+			counts = {name: getattr(self, name) for name in self.counters}
+			if counts == self.saved_counts:
+				return
+			totals = self.stats()
+			try:
+				with open(self.stats_file + ".tmp", "w") as fh:
+					json.dump(totals, fh)
+				os.replace(self.stats_file + ".tmp", self.stats_file)
+			except FileNotFoundError:		# cache directory removed
+				return
+			self.saved_counts = counts
+
+	def _remove_stats(self):
+		try:
+			os.unlink(self.stats_file)
+		except FileNotFoundError:
+			pass
+		self.saved_counts = {name: getattr(self, name) for name in self.counters}
@@ -1,6 +1,8 @@
 from urllib.parse import urlparse, urljoin, parse_qsl, unquote, urlencode, urldefrag
 from dataclasses import dataclass
-import re
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+from copy import deepcopy
 import traceback
 import logging
 
@@ -9,7 +11,11 @@ from lxml import etree as ET
 from .fetcher import Fetcher
 from .article import WebpageMetadata, Article
 from .hrange import HighlightRange
+from .article_cache import ArticleCache
+from . import patterns
 from ..utils.babel import gettext as _
+from ..utils.tracer import tracer
+from ..utils.context import copy_current_context
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +61,16 @@ class MeetingMediaItem:
 # a list of the vidoes and pictures therein.
 class MeetingLoader(Fetcher):
 
+	# Increase this when a change to the extractor changes its output so
+	# that media lists cached by the previous version are not used.
+	extraction_version = 1
+
+	# Number of threads used to resolve links in get_media() (1 to resolve them one-by-one)
+	link_workers = 4
+
+	# Linked articles which have already been parsed, shared by all instances
+	article_cache = ArticleCache()
+
 	# Get pointers to the Meeting Workbook and Watchtower articles to be
 	# studied during a particular week. Though we later load the articles
 	# from the main site <https://www.jw.org>, these are retrieved from
@@ -79,7 +95,7 @@ class MeetingLoader(Fetcher):
 		if len(mwb_div) > 0:
 			mwb_div = mwb_div[0]
 			# The MEPS docId is one of the classes of the todayItem <div> tag.
-			result["mwb_docid"] = int(re.search(r" docId-(\d+) ", mwb_div.attrib["class"]).group(1))
+			result["mwb_docid"] = int(patterns.class_docid.search(mwb_div.attrib["class"]).group(1))
 		else:
 			result["mwb_docid"] = None
 
@@ -89,7 +105,7 @@ class MeetingLoader(Fetcher):
 		watchtower_div = today_items.find_class("pub-w")
 		if len(watchtower_div) > 0:
 			watchtower_div = watchtower_div[0]
-			result["watchtower_docid"] = int(re.search(r" docId-(\d+) ", watchtower_div.attrib["class"]).group(1))
+			result["watchtower_docid"] = int(patterns.class_docid.search(watchtower_div.attrib["class"]).group(1))
 		else:
 			result["watchtower_docid"] = None
 
@@ -111,6 +127,7 @@ class MeetingLoader(Fetcher):
 	# Fetch the indicated article from WWW.JW.ORG, parse the HTML,
 	# pull out a few commonly needed things, and return it all in
 	# an Article() object.
+	@tracer.traced("article", "url")
 	def get_article(self, url:str):
 		assert isinstance(url, str)
 		return Article(url, self.get_html(url))
@@ -153,7 +170,7 @@ class MeetingLoader(Fetcher):
 		assert isinstance(article, Article)
 		assert callable(callback)
 
-		if len(article.bodyTxt.xpath("./div[@class='section']")) > 0:
+		if len(patterns.mwb_sections(article.bodyTxt)) > 0:
 			parser = self.mwb_parser_old(article)
 		else:
 			parser = self.mwb_parser_new(article)
@@ -238,19 +255,19 @@ class MeetingLoader(Fetcher):
 	#
 	def mwb_parser_old(self, article):
 		section_number = 0
-		for section in article.bodyTxt.xpath("./div[@class='section']"):
+		for section in patterns.mwb_sections(article.bodyTxt):
 			section_number += 1
-			el = section.xpath("./div/h2")
+			el = patterns.mwb_section_h2(section)
 			if len(el) > 0:
 				section_title = el[0].text_content().strip()
 			else:
 				section_title = None
 
 			part_number = 0
-			for part in section.xpath("./div[@class='pGroup']/ul/li"):
+			for part in patterns.mwb_section_parts(section):
 				part_number += 1
 				print(">>>", part.text_content().strip())
-				for strong in part.xpath(".//strong"):
+				for strong in patterns.any_strong(part):
 					part_title = strong.text_content().strip()
 					if len(part_title) > 1:		# not a quote mark
 						break
@@ -321,7 +338,7 @@ class MeetingLoader(Fetcher):
 		sections = [[None, []]]
 		for el in article.bodyTxt:
 			# Examples of how
-			h2 = el.xpath("./h2")
+			h2 = patterns.child_h2(el)
 			if h2:
 				sections.append([h2[0].text_content().strip(), []])
 			else:
@@ -340,7 +357,7 @@ class MeetingLoader(Fetcher):
 				if el.tag == "h3":
 					part_number += 1
 					# If this is a song, we process pub links within the <h3>.
-					song_link = el.xpath(".//a[@class='pub-sjj']")
+					song_link = patterns.song_links(el)
 					if song_link:
 						part_title = song_link[0].text_content().strip()
 					# If not, the title applies to the <div>'s which follow.
@@ -348,7 +365,7 @@ class MeetingLoader(Fetcher):
 						part_title = el.text_content().strip()
 						continue
 				else:
-					h3 = el.xpath(".//h3")
+					h3 = patterns.any_h3(el)
 					if h3:
 						part_number += 1
 						part_title = h3[0].text_content().strip()
@@ -359,59 +376,108 @@ class MeetingLoader(Fetcher):
 
 	# Extract media of the specified types from the HTML container provided.
 	# If follow_links is True, follow links and to other documents and extract
-	# their media too.
-	def get_media(self, container, baseurl:str, types:set, callback, follow_links:bool=False):
+	# their media too. Calls made while following links pass on the executor
+	# of the outermost call so that nesting does not multiply the threads.
+	def get_media(self, container, baseurl:str, types:set, callback, follow_links:bool=False, executor=None):
 		assert isinstance(container, ET.ElementBase)
 		assert isinstance(baseurl, str)
 		assert isinstance(types, set)
 		assert callable(callback)
 		assert isinstance(follow_links, bool)
+		if executor is None and self.link_workers > 1:
+			with ThreadPoolExecutor(max_workers=self.link_workers, thread_name_prefix="link") as executor:
+				yield from self._get_media(container, baseurl, types, callback, follow_links, executor)
+		else:
+			yield from self._get_media(container, baseurl, types, callback, follow_links, executor)
+
+	# Walk the container and return the media items in document order.
+	# Links are resolved by the executor (if there is one) while the walk
+	# continues. Figures, callbacks, and the following of linked articles
+	# stay in this thread so that progress messages come out in order and
+	# nested calls do not wait on the executor from inside one of its workers.
+	def _get_media(self, container, baseurl, types, callback, follow_links, executor):
 		context = ET.iterwalk(container, events={"start"}, tag={"a", "figure"})
-		linked_articles = {}
+		pending = deque()		# (future, function to turn its result into items)
+		max_pending = 2 * self.link_workers
+
+		def submit(fn, *args):
+			if executor is not None:
+				return executor.submit(copy_current_context(tracer.wrap(fn)), *args)
+			future = Future()
+			try:
+				future.set_result(fn(*args))
+			except Exception as e:
+				future.set_exception(e)
+			return future
+
+		# Yield the items for the links at the head of the queue which have
+		# been resolved. If block is True, wait until the queue is down to limit.
+		def drain(limit=0, block=False):
+			while len(pending) > limit and (block or pending[0][0].done()):
+				future, handler = pending.popleft()
+				yield from handler(future.result())
+
+		def link_items(item_tag, pub):
+			if pub is None:
+				# FIXME: Watchtower for week of November 25, 2024 triggers this
+				#logger.warning("Skipping link not understood: %s", item_tag.attrib)
+				return
+
+			# If the caller is looking for media items of this type, return it.
+			if pub.is_a in types:
+				yield pub
+
+			# Whether or not we returned the item above, if it is an article,
+			# and we are supposed to scrape linked articles, get and return any
+			# media items it may contain.
+			if pub.is_a == "article" and follow_links:
+				yield from self.get_media_from_linked_article(pub, item_tag.attrib.get("data-highlightrange"), callback, executor=executor)
+
 		for action, item_tag in context:
 
 			if item_tag.tag == "figure":
 				if "image" in types:
-					for item in self.get_figure_items(item_tag, baseurl, types):
-						yield item
+					future = Future()
+					future.set_result(list(self.get_figure_items(item_tag, baseurl, types)))
+					pending.append((future, iter))
 				# Don't let <a> handler see <a>'s in <figure>'s since get_figure_items() handles them.
 				context.skip_subtree()
 
 			elif (item_tag.tag == "a") and not set(("fn-symbol", "footnoteLink")).intersection(set(item_tag.attrib.get("class","").split())):
-				pub = self.get_pub_from_a_tag(item_tag, baseurl)
-				if pub is None:
-					# FIXME: Watchtower for week of November 25, 2024 triggers this
-					#logger.warning("Skipping link not understood: %s", item_tag.attrib)
-					continue
-
-				# If the caller is looking for media items of this type, return it.
-				if pub.is_a in types:
-					yield pub
-
-				# Whether or not we returned the item above, if it is an article,
-				# and we are supposed to scrape linked articles, get and return any
-				# media items it may contain.
-				if pub.is_a == "article" and follow_links:
-					for item in self.get_media_from_linked_article(pub, item_tag.attrib.get("data-highlightrange"), linked_articles, callback):
-						yield item
+				# Workers get their own copy of the <a>. Nothing modifies the
+				# tree any more, but lxml does not promise that one document
+				# can be read from several threads at once, and an <a> is
+				# cheap to copy.
+				pending.append((
+					submit(self.get_pub_from_a_tag, deepcopy(item_tag) if executor is not None else item_tag, baseurl),
+					lambda pub, item_tag=item_tag: link_items(item_tag, pub),
+					))
+
+			yield from drain()
+			yield from drain(max_pending, block=True)
+
+		yield from drain(block=True)
 
 	# This is used to load the Congregation Bible Study material
 	# TODO: Might a future publication have standalone video links stead of hyperlinked figures?
-	def get_media_from_linked_article(self, pub:MeetingMediaItem, highlightrange:str, linked_articles:dict, callback):
+	def get_media_from_linked_article(self, pub:MeetingMediaItem, highlightrange:str, callback, executor=None):
 		assert isinstance(pub, MeetingMediaItem)
 		assert isinstance(highlightrange, str) or highlightrange is None
-		assert isinstance(linked_articles, dict)
 
 		callback(_("Getting media list from \"%s\"...") % pub.title)
 
 		# Load article, find figures, and attach them to paragraphs
+		# (or take the result of doing so from the cache).
 		article_href = pub.media_url
-		article = linked_articles.get(article_href)
-		if article is None:
-			article = linked_articles[article_href] = HighlightRange(self.get_article(article_href))
+		article = self.article_cache.get(
+			article_href,
+			self.language,
+			lambda: HighlightRange(self.get_article(urldefrag(article_href).url)),
+			lambda hrange: hrange.article.root,
+			)
 
 		# If the URL has a fragment identifying a paragraph range,
-		if highlightrange is not None and (m := re.match(r"^p(\d+)-p(\d+)$", highlightrange)):
+		if highlightrange is not None and (m := patterns.highlight_range.match(highlightrange)):
 			article_href = urldefrag(article_href).url
 			start = int(m.group(1))
 			end = int(m.group(2))
@@ -420,13 +486,13 @@ class MeetingLoader(Fetcher):
 			figures = article.figures
 
 		if article.top_image is not None:
-			item = list(self.get_media(article.top_image, article_href, {"image"}, callback))[0]
+			item = list(self.get_media(article.top_image, article_href, {"image"}, callback, executor=executor))[0]
 			item.pub_code = pub.pub_code
 			yield item
 
 		# Pull illustrations from the portion of the article selected above.
 		for figure in figures:
-			for item in self.get_media(figure.el, article_href, {"image", "video"}, callback):
+			for item in self.get_media(figure.el, article_href, {"image", "video"}, callback, executor=executor):
 				if item.pub_code is None:
 					item.pub_code = pub.pub_code
 				yield item
@@ -460,12 +526,12 @@ class MeetingLoader(Fetcher):
 		# Extract publication code
 		# We may use it below to figure out what we've got.
 		# FIXME: assumes the <a> tag has only this one class
-		pub_code = re.match(r"^pub-(\S+)$", a.attrib.get("class",""))
+		pub_code = patterns.a_pub_code.match(a.attrib.get("class",""))
 		if pub_code is not None:
 			pub_code = pub_code.group(1)
 
 		# Extract MEPS document ID
-		docid = re.match(r"^mid(\d+)$", a.attrib.get("data-page-id",""))
+		docid = patterns.a_docid.match(a.attrib.get("data-page-id",""))
 		if docid is not None:
 			docid = int(docid.group(1))
 
@@ -569,7 +635,7 @@ class MeetingLoader(Fetcher):
 		assert a.tag == "a"
 
 		song_text = a.text_content().strip()
-		song_number = re.search(r"(\d+)$", song_text)
+		song_number = patterns.trailing_number.search(song_text)
 		assert song_number is not None, "Song number: %s" % repr(song_number)
 		song_number = int(song_number.group(1))
 
@@ -700,7 +766,7 @@ class MeetingLoader(Fetcher):
 		assert figure.tag == "figure"
 		assert isinstance(baseurl, str)
 		assert isinstance(types, set)
-		self.dump_html(figure)
+		self.dump_html(figure, level=2)
 
 		#
 		# Examples (before modification by the Javascript):
@@ -777,9 +843,9 @@ class MeetingLoader(Fetcher):
 		# Use it's text as the caption.
 		elif link is not None and (blurb_div := figure.getparent().getnext()) is not None:
 			href = link.attrib.get("href")
-			if len(blurb_a := blurb_div.xpath(".//a[@href='%s']" % href)) > 0 \
+			if len(blurb_a := patterns.links_by_href(blurb_div, href=href)) > 0 \
 					or ((video := link.attrib.get("data-video")) is not None and \
-						len(blurb_a := blurb_div.xpath(".//a[@data-video='%s']" % video)) > 0):
+						len(blurb_a := patterns.links_by_video(blurb_div, video=video)) > 0):
 				caption = blurb_a[0].text_content().strip()
 
 		# Is this image hyperlinked to a video or article?
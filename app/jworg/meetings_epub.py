@@ -0,0 +1,137 @@
+# Extract meeting media from the EPUB edition of the Meeting Workbook or
+# the Watchtower rather than from the web pages on JW.ORG
+#
+# The chapter for the week is found through the OPF manifest and NCX table
+# of contents and run through the same extractors as the web version.
+# Pictures are copied out of the EPUB into the media cache, so only linked
+# videos and articles in other publications need the network (and those
+# may well be in the HTTP and metadata caches already).
+
+import os
+import re
+import posixpath
+from pathlib import Path
+import logging
+
+from .meetings import MeetingLoader, MeetingMediaItem
+from .article import Article
+from . import patterns
+from ..utils.babel import gettext as _
+
+logger = logging.getLogger(__name__)
+
+# Presents a chapter of an EPUB with the interface of Article
+class EpubArticle(Article):
+	def __init__(self, url, root, href, pub_code, issue_code, docid):
+		self.url = url
+		self.root = root
+		self.href = href		# path of XHTML file within the EPUB
+
+		el = patterns.head_title(root)
+		self.title = el[0].text if len(el) > 0 else None
+		self.main_tag = root.find("./body")
+		self.article_tag = self.main_tag
+		el = patterns.any_h1(self.main_tag)
+		self.h1 = el[0].text_content().strip() if len(el) > 0 else self.title
+		el = patterns.body_txt(self.main_tag)
+		self.bodyTxt = el[0] if len(el) > 0 else self.main_tag
+		self.thumbnail_url = None
+		self.pub_code = pub_code
+		self.issue_code = issue_code
+		self.docid = docid
+
+class EpubMeetingLoader(MeetingLoader):
+	def __init__(self, epub, pub_code:str, issue_code:str, document_href:str=None, **kwargs):
+		super().__init__(**kwargs)
+		self.epub = epub
+		self.pub_code = pub_code
+		self.issue_code = issue_code
+		self.document_href = document_href		# if known, such as from Articles.epub_href
+
+	# Find the XHTML file of the article with the indicated MEPS document ID.
+	# JW.ORG EPUBs name their chapter files after the docid. If this one does
+	# not, look in each chapter for the docId-NNN class which the web version
+	# also puts on its <article> tag. The docid must match as a whole number
+	# since the docids of the other articles of the issue share its digits.
+	def find_document(self, docid:int):
+		docid_pattern = re.compile(r"(?<!\d)%d(?!\d)" % docid)
+		for item in self.epub.opf.toc:
+			if docid_pattern.search(posixpath.basename(item.href.split("#")[0])):
+				return item.href.split("#")[0]
+		for item in self.epub.opf.manifest_by_id.values():
+			if item.mimetype == "application/xhtml+xml" and docid_pattern.search(posixpath.basename(item.href)):
+				return item.href
+		marker = f"docId-{docid}"
+		for item in self.epub.opf.toc:
+			href = item.href.split("#")[0]
+			root = self.epub.load_html(href)
+			for el in root.iter("body", "article", "div"):
+				if marker in el.attrib.get("class", "").split():
+					return href
+		return None
+
+	# Counterpart of .extract_media() which takes the article from the EPUB
+	def extract_media(self, docid:int, callback):
+		assert isinstance(docid, int)
+		assert callable(callback)
+
+		# Use the href we were given, if it is in this EPUB, rather than searching
+		href = self.document_href
+		if href is None or href not in self.epub.opf.manifest_by_href:
+			href = self.find_document(docid)
+		if href is None:
+			raise FileNotFoundError("Document %d not in EPUB of %s %s" % (docid, self.pub_code, self.issue_code))
+		self.document_href = href
+		article = EpubArticle(self.meeting_url(docid), self.epub.load_html(href), href, self.pub_code, self.issue_code, docid)
+		callback(_("Article title: \"%s\"") % article.title)
+
+		extractor = getattr(self, f"extract_media_{article.pub_code}", None)
+		assert extractor is not None, f"No extractor for {article.pub_code}"
+		return extractor(article, callback)
+
+	# Links between chapters of the EPUB are relative. We do not follow them.
+	def get_pub_from_a_tag(self, a, baseurl:str=None, title:str=None, dnd:bool=False):
+		if "://" not in a.attrib.get("href", ""):
+			logger.debug("Skipping link within EPUB: %s", a.attrib.get("href"))
+			return None
+		return super().get_pub_from_a_tag(a, baseurl, title=title, dnd=dnd)
+
+	# The EPUB has plain <img> tags in its figures rather than the
+	# <span class="jsRespImg"> tags of the web version. Figures which are
+	# links to videos or articles are handled as on the web.
+	def get_figure_items(self, figure, baseurl:str, types:set):
+		if figure.find("./a") is not None or figure.find(".//span[@class='jsRespImg']") is not None:
+			yield from super().get_figure_items(figure, baseurl, types)
+			return
+		if "image" not in types:
+			return
+
+		caption = None
+		if (figcaption := figure.find("./figcaption")) is not None:
+			caption = figcaption.text_content().strip().removesuffix("*").rstrip()
+
+		for img in figure.iter("img"):
+			image_file = self.extract_image(posixpath.normpath(posixpath.join(posixpath.dirname(self.document_href), img.attrib["src"])))
+			yield MeetingMediaItem(
+				title = caption or img.attrib.get("alt","").strip() or None,
+				pub_code = None,			# caller can fill in, if needed
+				media_type = "image",
+				is_a = "image",
+				media_url = Path(image_file).as_uri(),
+				)
+
+	# Copy an image out of the EPUB into the media cache. Different EPUBs
+	# can have images with the same name, so the name of the copy includes
+	# the language, publication, and issue.
+	def extract_image(self, path:str):
+		if self.cachedir is None:
+			raise FileNotFoundError("Cachedir is not set")
+		filename = f"epub-{self.meps_language}-{self.pub_code}-{self.issue_code}-{posixpath.basename(path)}"
+		image_file = os.path.abspath(os.path.join(self.cachedir, filename))
+		if not os.path.exists(image_file):
+			fh, size = self.epub.open(path)
+			with fh, open(image_file + ".tmp", "wb") as out:
+				while (data := fh.read(0x10000)):
+					out.write(data)
+			os.replace(image_file + ".tmp", image_file)
+		return image_file
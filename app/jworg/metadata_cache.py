@@ -0,0 +1,69 @@
+# Persistent cache of video metadata from the Mediator and Pub Media APIs
+#
+# The complete media record (all file variants, subtitles, and images) is
+# stored so that requests for different resolutions can be answered from
+# the same entry. Keys are normalized identifiers such as:
+# * lank:pub-mwbv_202105_1_VIDEO:U
+# * pub:sjjm:track:3:U
+# * docid:502016112:U
+#
+# We also remember for a shorter time that a video is not yet available
+# so that we do not ask again and again during a single extraction.
+
+import os
+import sqlite3
+import json
+from threading import Lock
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MetadataCache:
+	def __init__(self, path, ttl=7*86400, negative_ttl=3600):
+		self.ttl = ttl
+		self.negative_ttl = negative_ttl
+		self.lock = Lock()
+		self.hits = 0
+		self.misses = 0
+		if os.path.dirname(path):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+		self.conn = sqlite3.connect(path, check_same_thread=False)
+		with self.lock, self.conn:
+			self.conn.execute("""
+				CREATE TABLE IF NOT EXISTS metadata (
+					key TEXT PRIMARY KEY,
+					data TEXT,
+					error TEXT,
+					expires REAL NOT NULL
+				)""")
+
+	# Return (data, error) for an unexpired entry or None if there is none.
+	def lookup(self, key):
+		with self.lock:
+			row = self.conn.execute("SELECT data, error FROM metadata WHERE key = ? AND expires > ?", (key, time())).fetchone()
+		if row is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		data, error = row
+		return (json.loads(data) if data is not None else None, error)
+
+	def store(self, key, data):
+		self._store(key, json.dumps(data), None, self.ttl)
+
+	# Remember that there is no media for this key
+	def store_error(self, key, error):
+		self._store(key, None, error, self.negative_ttl)
+
+	def _store(self, key, data, error, ttl):
+		with self.lock, self.conn:
+			self.conn.execute("INSERT OR REPLACE INTO metadata (key, data, error, expires) VALUES (?, ?, ?, ?)", (key, data, error, time() + ttl))
+
+	def clear(self):
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM metadata")
+
+	def count(self):
+		with self.lock:
+			return self.conn.execute("SELECT COUNT(*) FROM metadata WHERE expires > ?", (time(),)).fetchone()[0]
@@ -0,0 +1,69 @@
+# Precompiled XPath expressions and regular expressions shared by the
+# parsers of JW.ORG pages
+#
+# Calling .xpath() with a string compiles the expression every time. These
+# are compiled once when the module is loaded. Where an expression needs a
+# value from the page (such as an href), it is passed as an XPath variable
+# rather than pasted into the expression, so quotes in it do no harm.
+
+import re
+from lxml import etree as ET
+
+#------------------------------------------
+# Page structure (article.py)
+#------------------------------------------
+head_title = ET.XPath("./head/title")
+head_og_image = ET.XPath("./head/meta[@property='og:image']")
+any_h1 = ET.XPath(".//h1")
+any_main = ET.XPath(".//main")
+any_article = ET.XPath(".//article")
+any_base = ET.XPath(".//base")
+body_txt = ET.XPath(".//div[@class='bodyTxt']")
+video_player = ET.XPath(".//div[@class='jsIncludeVideo']")
+
+#------------------------------------------
+# Meeting Workbook (meetings.py)
+#------------------------------------------
+mwb_sections = ET.XPath("./div[@class='section']")
+mwb_section_h2 = ET.XPath("./div/h2")
+mwb_section_parts = ET.XPath("./div[@class='pGroup']/ul/li")
+child_h2 = ET.XPath("./h2")
+any_h3 = ET.XPath(".//h3")
+any_strong = ET.XPath(".//strong")
+song_links = ET.XPath(".//a[@class='pub-sjj']")
+
+# Find the blurb which goes with a figure
+links_by_href = ET.XPath(".//a[@href=$href]")
+links_by_video = ET.XPath(".//a[@data-video=$video]")
+
+#------------------------------------------
+# Publication lists (publications.py)
+#------------------------------------------
+any_a = ET.XPath(".//a")
+any_img_src = ET.XPath(".//img/@src")
+
+#------------------------------------------
+# Regular expressions
+#------------------------------------------
+
+# Publication code, issue, and document ID in a space-separated class list
+class_pub_code = re.compile(r" pub-(\S+) ")
+class_issue_code = re.compile(r" iss-(\S+) ")
+class_docid = re.compile(r" docId-(\d+) ")
+class_doc_class = re.compile(r" docClass-(\d+) ")
+
+# Attributes of <a> tags
+a_pub_code = re.compile(r"^pub-(\S+)$")
+a_docid = re.compile(r"^mid(\d+)$")
+
+# Paragraph (p1, p2, ...) or figure (f1, f2, ...) id attribute
+paragraph_or_figure_id = re.compile(r"([pf])(\d+)$")
+
+# Value of data-highlightrange attribute such as "p3-p7"
+highlight_range = re.compile(r"^p(\d+)-p(\d+)$")
+
+trailing_number = re.compile(r"(\d+)$")
+
+# Language Agnostic Natural Key of a video in a publication, such as
+# pub-sjjm_3_VIDEO (song 3) or pub-mwbv_202103_2_VIDEO (track 2 of an issue)
+lank_pub_track = re.compile(r"^pub-([a-z0-9]+?)_(?:(\d{6})_)?(\d+)_VIDEO$")
@@ -1,9 +1,9 @@
 from urllib.parse import urljoin, quote
 from dataclasses import dataclass
-import re
 import logging
 
 from .fetcher import Fetcher
+from . import patterns
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +36,7 @@ class PubFinder(Fetcher):
 			html = self.get_html(urljoin(base_url, page_href), query)
 			#self.dump_html(html)
 
-			base = html.xpath(".//base")
+			base = patterns.any_base(html)
 			if len(base) > 0:
 				base_url = urljoin(base_url, base[0].attrib['href'])
 
@@ -45,11 +45,11 @@ class PubFinder(Fetcher):
 			# Pages listing periodicals (the Watchtower, Awake!, and the Meeting
 			# Workbook) give the periodical name as a section heading. Pages listing
 			# books and brocures lack this section heading.
-			h2 = container.xpath("./h2")
+			h2 = patterns.child_h2(container)
 			if len(h2) > 0:
 				periodical_name = h2[0].text
 			else:
-				h1 = html.xpath(".//h1")
+				h1 = patterns.any_h1(html)
 				if len(h1) > 0:
 					periodical_name = h1[0].text
 				else:
@@ -61,16 +61,16 @@ class PubFinder(Fetcher):
 					continue
 				#self.dump_html(pub)
 
-				m = re.search(r" pub-(\S+) ", pub.attrib['class'])
+				m = patterns.class_pub_code.search(pub.attrib['class'])
 				assert m
 				code = m.group(1)
 
 				# Each synopsis contains two <div>s. The first contains a thumbnail image
 				# linked to the HTML version of the publication.
 				syn_image = pub.find_class('syn-img')[0]
-				image_link = syn_image.xpath(".//a")[0]
+				image_link = patterns.any_a(syn_image)[0]
 				href = urljoin(self.base_url, image_link.attrib['href'])
-				thumbnail = urljoin(self.base_url, image_link.xpath(".//img/@src")[0])
+				thumbnail = urljoin(self.base_url, patterns.any_img_src(image_link)[0])
 
 				# The second <div> contains the name of the publication and links
 				# to more versions of it.
@@ -80,7 +80,7 @@ class PubFinder(Fetcher):
 
 				# Periodicals will have a periodical name, an issue title, and an issue date.
 				if periodical_name is not None and " iss-" in pub.attrib['class']:
-					m = re.search(r" iss-(\S+) ", pub.attrib['class'])
+					m = patterns.class_issue_code.search(pub.attrib['class'])
 					issue_code = m.group(1)
 					pubs.append(Publication(
 						name = periodical_name,
@@ -129,10 +129,10 @@ class PubFinder(Fetcher):
 		articles = []
 		for synopsis in toc.find_class('synopsis'):
 			#self.dump_html(synopsis)
-			docId = re.search(r" docId-(\d+) ", synopsis.attrib['class']).group(1)
-			docClass = re.search(r" docClass-(\d+) ", synopsis.attrib['class']).group(1)
+			docId = patterns.class_docid.search(synopsis.attrib['class']).group(1)
+			docClass = patterns.class_doc_class.search(synopsis.attrib['class']).group(1)
 			syn_body = synopsis.find_class('syn-body')[0]
-			link = syn_body.xpath(".//a")[0]
+			link = patterns.any_a(syn_body)[0]
 			if docClass_filter is not None:
 				if not docClass in docClass_filter:
 					continue
@@ -0,0 +1,90 @@
+# Per-host rate limiting for Fetcher
+#
+# Each host gets a token bucket. A request takes a token. Tokens are
+# replenished at one per interval up to the size of the bucket (the burst).
+# This lets us stay polite to the servers which generate HTML pages while
+# downloading images and videos from the CDN's as fast as they will go.
+
+from fnmatch import fnmatch
+from threading import Lock
+from time import time, sleep
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+	def __init__(self, interval, burst):
+		self.interval = interval	# seconds per token
+		self.burst = burst			# maximum number of tokens saved up
+		self.tokens = burst
+		self.last_update = time()
+
+	def _refill(self, now):
+		if self.interval > 0:
+			self.tokens = min(self.burst, self.tokens + (now - self.last_update) / self.interval)
+		else:
+			self.tokens = self.burst
+		self.last_update = now
+
+	# Take a token and return the time we must wait before using it. The
+	# count may go negative, which reserves tokens for callers who are
+	# already waiting.
+	def take(self):
+		now = time()
+		self._refill(now)
+		self.tokens -= 1
+		if self.tokens >= 0:
+			return 0
+		return -self.tokens * self.interval
+
+	# Give back a token for a request which cost the server nothing
+	def refund(self):
+		self._refill(time())
+		self.tokens = min(self.burst, self.tokens + 1)
+
+class RateLimiter:
+
+	# Limits for host names or patterns. Exact host names take priority
+	# over patterns and more specific patterns over less specific ones.
+	default_limits = {
+		"wol.jw.org": {"interval": 2.5, "burst": 1},
+		"www.jw.org": {"interval": 2.5, "burst": 1},
+		"*.jw-cdn.org": {"interval": 0.1, "burst": 10},
+		"*.akamaihd.net": {"interval": 0.1, "burst": 10},
+		"*": {"interval": 2.5, "burst": 1},
+		}
+
+	def __init__(self, limits=None):
+		self.limits = dict(limits or {})
+		for pattern, limit in self.default_limits.items():
+			self.limits.setdefault(pattern, limit)
+		self.lock = Lock()
+		self.buckets = {}
+
+	# Find the limit which applies to this host
+	def limit_for(self, host):
+		if host in self.limits:
+			return self.limits[host]
+		for pattern in sorted(self.limits, key=lambda pattern: (pattern == "*", -len(pattern))):
+			if fnmatch(host, pattern):
+				return self.limits[pattern]
+		return self.default_limits["*"]
+
+	def _bucket(self, host):
+		bucket = self.buckets.get(host)
+		if bucket is None:
+			limit = self.limit_for(host)
+			bucket = self.buckets[host] = TokenBucket(limit["interval"], limit["burst"])
+		return bucket
+
+	# Block until we may send a request to this host
+	def wait(self, host):
+		with self.lock:
+			delay = self._bucket(host).take()
+		if delay > 0:
+			logger.debug("Waiting %.2f seconds before request to %s", delay, host)
+			sleep(delay)
+
+	def refund(self, host):
+		with self.lock:
+			self._bucket(host).refund()
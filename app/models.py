@@ -1,11 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import date
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime
 
 db = SQLAlchemy()
 
 def init_app(app):
 	db.init_app(app)
 	db.create_all()
+	migrate()
+
+# Bring tables created by earlier versions up to date. (create_all() only
+# creates missing tables, not missing columns or indexes.)
+def migrate():
+	columns = {column["name"] for column in inspect(db.engine).get_columns("meeting_cache")}
+	with db.engine.begin() as conn:
+		if "extraction_version" not in columns:
+			conn.execute(text("ALTER TABLE meeting_cache ADD COLUMN extraction_version INTEGER NOT NULL DEFAULT 0"))
+		if "extracted_at" not in columns:
+			conn.execute(text("ALTER TABLE meeting_cache ADD COLUMN extracted_at DATETIME"))
+		# Before the unique index existed, races could produce duplicate rows. Keep the newest.
+		conn.execute(text("DELETE FROM meeting_cache WHERE id NOT IN (SELECT MAX(id) FROM meeting_cache GROUP BY lang, docid)"))
+		conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_meeting_cache_lang_docid ON meeting_cache (lang, docid)"))
 
 class Config(db.Model):
 	id = db.Column(db.Integer, primary_key=True)
@@ -33,6 +49,27 @@ class MeetingCache(db.Model):
 	lang = db.Column(db.String)
 	docid = db.Column(db.Integer)		# Watchtower or Workbook article
 	media = db.Column(db.JSON)			# Extracted media list
+	extraction_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")	# MeetingLoader.extraction_version
+	extracted_at = db.Column(db.DateTime)		# None if unknown (made by an older version)
+	__table_args__ = (
+		db.Index("ix_meeting_cache_lang_docid", "lang", "docid", unique=True),
+		)
+
+	# Insert or replace the media list for a meeting. This is safe when two
+	# requests extract the same meeting at once: the last one wins.
+	@classmethod
+	def store(cls, lang, docid, media, extraction_version):
+		stmt = sqlite_insert(cls).values(lang=lang, docid=docid, media=media, extraction_version=extraction_version, extracted_at=datetime.now())
+		stmt = stmt.on_conflict_do_update(
+			index_elements = ["lang", "docid"],
+			set_ = {
+				"media": stmt.excluded.media,
+				"extraction_version": stmt.excluded.extraction_version,
+				"extracted_at": stmt.excluded.extracted_at,
+				},
+			)
+		db.session.execute(stmt)
+		db.session.commit()
 
 #=============================================================================
 # Lists of Publications and links to them on JW.ORG
@@ -9,6 +9,8 @@ def init_app(app, url_prefix):
 	# Create the cache of fragments of zip files from Google Drive
 	if not os.path.exists(app.config["GDRIVE_CACHEDIR"]):
 		os.makedirs(app.config["GDRIVE_CACHEDIR"])
+	from .utils.httpfile import FileCache
+	FileCache.max_size = app.config["GDRIVE_CACHE_MAX_SIZE"]
 
 	app.jinja_env.globals["menu"] = menu
 	app.jinja_env.filters["runningtime"] = time_to_str
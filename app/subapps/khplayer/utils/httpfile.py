@@ -1,6 +1,10 @@
-import os, re, json
+import os, re, json, base64, struct, errno
+from collections import OrderedDict
+from time import monotonic
+from threading import Lock, Condition, local
+from concurrent.futures import ThreadPoolExecutor
 from requests import Session
-from zipfile import ZipFile, ZIP_STORED
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, BadZipFile, sizeFileHeader, structFileHeader, stringFileHeader
 
 class HttpFileError(Exception):
 	pass
@@ -24,15 +28,32 @@ class Seekable:
 				raise ValueError(f"whence {whence} is invalid")
 
 # Open an HTTP URL as a seekable file
+#
+# ZipFile reads headers and data in many small pieces. So that each one
+# does not become its own HTTP request, we ask for more than was requested
+# and keep the extra in a buffer. The read-ahead window starts at
+# readahead_min and doubles with each read which follows on from the
+# previous one, up to readahead_max. A read elsewhere in the file sets
+# it back to readahead_min. (Set readahead_max to 0 to disable.)
 class HttpFile(Seekable):
+	readahead_min = 16 * 1024
+	readahead_max = 1024 * 1024
+
 	def __init__(self, url, debug=False):
 		self.session = Session()
 		self._url = url
 		self.debug = debug
 		self._pos = 0
 		self._file_size = None
-		self._total_read = 0
+		self._buffer = b""
+		self._buffer_start = 0
+		self._last_read_end = None
+		self._readahead = min(self.readahead_min, self.readahead_max)
+
+		# Statistics
 		self._request_count = 0
+		self._total_read = 0		# bytes received from the server
+		self._total_used = 0		# bytes returned by read()
 
 	def _request_range(self, start:int, end:int):
 		if self.debug:
@@ -68,9 +89,38 @@ class HttpFile(Seekable):
 		self._total_read += len(data)
 		return data
 
+	# Send a HEAD request to learn the size of the file and the validators
+	# which tell us whether it has changed since we last saw it. Returns
+	# None if the server did not provide ETag or Last-Modified.
+	def head(self):
+		if self.debug:
+			print("HttpFile HEAD")
+		response = self.session.head(self._url, allow_redirects=True)
+		self._request_count += 1
+		if response.url != self._url:
+			if self.debug:
+				print(f" Redirected to: {response.url}")
+			self._url = response.url
+		if response.status_code != 200:
+			raise HttpFileError("HEAD failed: %s" % response.status_code)
+		if "Content-Length" not in response.headers:
+			return None
+		self._file_size = int(response.headers["Content-Length"])
+		if "ETag" not in response.headers and "Last-Modified" not in response.headers:
+			return None
+		return {
+			"etag": response.headers.get("ETag"),
+			"last-modified": response.headers.get("Last-Modified"),
+			"content-length": self._file_size,
+			}
+
+	# If we do not yet know the size of the file, fetch the end of it.
+	# The response tells us the size and the end is what ZipFile will
+	# want to read first.
 	def seek(self, offset, whence=0):
 		if whence == 2 and self._file_size is None:
-			self._request_range(start = 0, end = 0)
+			self._buffer = self._request_range(start = -max(self._readahead, 1), end = None)
+			self._buffer_start = self._file_size - len(self._buffer)
 		return super().seek(offset, whence)
 
 	def read(self, size:int=None):
@@ -79,39 +129,245 @@ class HttpFile(Seekable):
 		if size is None:
 			assert self._file_size is not None, "read() size must be specified until file size is known"
 			size = (self._file_size - self._pos)
-		data = self._request_range(
-			start = self._pos,
-			end = self._pos + size - 1,
-			)
+		if self._file_size is not None:
+			size = max(0, min(size, self._file_size - self._pos))
+		if size == 0:
+			return b""
+
+		start = self._pos
+		end = start + size
+		buffer_end = self._buffer_start + len(self._buffer)
+
+		# Not all of it is in the buffer. If the beginning is, keep that part
+		# and ask only for the rest, so that adjacent reads become a single
+		# request.
+		if not (self._buffer_start <= start and end <= buffer_end):
+			if self._buffer_start <= start < buffer_end:
+				head = self._buffer[start - self._buffer_start:]
+				sequential = True
+			else:
+				head = b""
+				sequential = (start == self._last_read_end)
+			if sequential:
+				self._readahead = min(max(self._readahead * 2, self.readahead_min), self.readahead_max)
+			else:
+				self._readahead = min(self.readahead_min, self.readahead_max)
+			fetch_start = start + len(head)
+			fetch_end = max(end, fetch_start + self._readahead)
+			if self._file_size is not None:
+				fetch_end = min(fetch_end, self._file_size)
+			self._buffer = head + self._request_range(start = fetch_start, end = fetch_end - 1)
+			self._buffer_start = start
+
+		data = self._buffer[start - self._buffer_start:end - self._buffer_start]
+
+		# Don't hold on to large reads, only to the read-ahead
+		if len(data) > self.readahead_max:
+			self._buffer = self._buffer[end - self._buffer_start:]
+			self._buffer_start = end
+
 		self._pos += len(data)
+		self._last_read_end = self._pos
+		self._total_used += len(data)
 		return data
 
+	# Another HttpFile for the same URL, for use in another thread
+	def copy(self):
+		http_file = HttpFile(self._url, debug=self.debug)
+		http_file._file_size = self._file_size
+		return http_file
+
+	# Counts of requests sent and bytes received and actually used
+	def stats(self):
+		return {
+			"requests": self._request_count,
+			"bytes_fetched": self._total_read,
+			"bytes_used": self._total_used,
+			}
+
 	def close(self):
 		if self.debug and self._file_size is not None:
 			percent = int(self._total_read * 100 / self._file_size + 0.5)
-			print(f"HttpFile close: {self._request_count} requests read {self._total_read} of {self._file_size} bytes ({percent}%)")
+			print(f"HttpFile close: {self._request_count} requests read {self._total_read} of {self._file_size} bytes ({percent}%), {self._total_used} bytes used")
 		self.session = None
 
 class FileCache(Seekable):
-	"""Disk cache which we can wrap around HttpFile"""
+	"""
+	Disk cache which we can wrap around HttpFile
+
+	The blocks of the remote file which have been read are stored at their
+	own offsets in a sparse file ({cachekey}.data) and a bitmap of which
+	blocks are present is kept in {cachekey}.json. So that storing a block
+	does not mean rewriting the metadata each time, it is saved at most
+	every metadata_save_interval seconds and when the cache is closed.
+	Blocks stored since the last save are simply fetched again if we are
+	stopped before the next one. Other information which callers keep with
+	the cached file (.extra) goes in {cachekey}.extra and is written only
+	when it changes.
+
+	The cache files of all of the remote files in a cache directory are
+	limited to max_size bytes. When they exceed it, those of the least
+	recently used remote files are removed.
+
+	A byte range can be prefetched by several threads at once. Reads of
+	blocks which are being prefetched wait for them to arrive.
+	"""
 	blocksize = 256 * 1024
+	max_size = 1024 * 1024 * 1024
+	prefetch_chunk_blocks = 16		# blocks fetched by each prefetch request
+	metadata_save_interval = 5.0	# seconds
+
+	# Bytes cached for each remote file (least recently used first) in
+	# each cache directory and the remote files which are open, shared by
+	# all instances in this process
+	_usage = {}
+	_open = set()
+	_lock = Lock()
+
 	def __init__(self, fh, cachedir, cachekey, debug=False):
 		self.fh = fh
 		self.cachedir = cachedir
 		self.cachekey = cachekey
 		self.debug= debug
-		self.cache = {}
 		self._pos = 0
 		self._file_size = None
+		self._bitmap = bytearray()
+		self._validators = None
+		self.extra = {}				# other information to keep with the cached file
 		self._metadata_file = os.path.join(self.cachedir, f"{self.cachekey}.json")
+		self._data_file = os.path.join(self.cachedir, f"{self.cachekey}.data")
+		self._extra_file = os.path.join(self.cachedir, f"{self.cachekey}.extra")
 
 		try:
 			with open(self._metadata_file) as fh:
 				metadata = json.load(fh)
+			if metadata.get("block-size") == self.blocksize and os.path.exists(self._data_file):
+				self._bitmap = bytearray(base64.b64decode(metadata["blocks"]))
+				self._validators = metadata.get("validators")
 			self._file_size = self.fh._file_size = metadata["file-size"]
-		except FileNotFoundError:
+		except (FileNotFoundError, ValueError, KeyError):
 			pass
 
+		# The side file is optional. Without it the cached blocks are still good.
+		if self._bitmap:
+			try:
+				with open(self._extra_file) as fh:
+					self.extra = json.load(fh)
+			except (FileNotFoundError, ValueError):
+				pass
+		self._metadata_saved = monotonic()
+
+		self._data = open(self._data_file, "r+b" if self._bitmap else "w+b")
+		self._io_lock = Lock()		# for systems without pread() and pwrite()
+		self._cond = Condition()	# guards the bitmap and _pending
+		self._pending = set()		# blocks being prefetched
+		self._executor = None
+		self._local = local()		# HttpFile of each prefetch thread
+
+		with self._lock:
+			usage = self._get_usage(self.cachedir)
+			usage[self.cachekey] = self._cached_bytes()
+			usage.move_to_end(self.cachekey)
+			self._open.add((self.cachedir, self.cachekey))
+
+	# Find out how much is cached for each remote file the first time
+	# a cache directory is used. Cache files in the old layout (a file
+	# for each block, named {cachekey}-NNNN, next to {cachekey}.json)
+	# are removed.
+	@classmethod
+	def _get_usage(cls, cachedir):
+		usage = cls._usage.get(cachedir)
+		if usage is None:
+			entries = []
+			scan = list(os.scandir(cachedir))
+			names = set(entry.name for entry in scan)
+			for entry in scan:
+				if (m := re.match(r"^(.+)-\d{4}$", entry.name)) and m.group(1) + ".json" in names:
+					os.unlink(entry.path)
+				elif entry.name.endswith(".json"):
+					try:
+						with open(entry.path) as fh:
+							bitmap = base64.b64decode(json.load(fh)["blocks"])
+					except (ValueError, KeyError):
+						continue
+					size = sum(bin(byte).count("1") for byte in bitmap) * cls.blocksize
+					entries.append((entry.stat().st_mtime, entry.name[:-5], size))
+			usage = cls._usage[cachedir] = OrderedDict((key, size) for mtime, key, size in sorted(entries))
+		return usage
+
+	# Remove the cache files of the least recently used remote files
+	# (except those which are open) until the total is within max_size.
+	@classmethod
+	def _evict(cls, cachedir):
+		usage = cls._get_usage(cachedir)
+		total = sum(usage.values())
+		for cachekey in list(usage.keys()):
+			if total <= cls.max_size:
+				break
+			if (cachedir, cachekey) in cls._open:
+				continue
+			for ext in (".data", ".json", ".extra"):
+				try:
+					os.unlink(os.path.join(cachedir, cachekey + ext))
+				except FileNotFoundError:
+					pass
+			total -= usage.pop(cachekey)
+
+	def _cached_bytes(self):
+		return sum(bin(byte).count("1") for byte in self._bitmap) * self.blocksize
+
+	def _has_block(self, blocknum:int):
+		byte = blocknum >> 3
+		return byte < len(self._bitmap) and self._bitmap[byte] & (1 << (blocknum & 7)) != 0
+
+	def _set_block(self, blocknum:int):
+		byte = blocknum >> 3
+		if byte >= len(self._bitmap):
+			self._bitmap.extend(bytes(byte + 1 - len(self._bitmap)))
+		self._bitmap[byte] |= 1 << (blocknum & 7)
+
+	# Write the metadata to a temporary file and then move it into place
+	# so that it is never seen half written
+	def _save_metadata(self):
+		save_json(self._metadata_file, {
+			"file-size": self._file_size,
+			"block-size": self.blocksize,
+			"blocks": base64.b64encode(self._bitmap).decode("ascii"),
+			"validators": self._validators,
+			})
+		self._metadata_saved = monotonic()
+
+	# Check the cache against the validators (ETag, Last-Modified, and
+	# Content-Length) from a HEAD request. If the remote file has changed
+	# (or we did not record them when it was cached), throw away what we
+	# have. Returns True if the cache is valid.
+	def validate(self, validators:dict):
+		with self._cond:
+			valid = (validators == self._validators)
+			if not valid:
+				if self.debug:
+					print(f"FileCache: {self.cachekey} has changed")
+				self._bitmap = bytearray()
+				self.extra = {}
+				try:
+					os.unlink(self._extra_file)
+				except FileNotFoundError:
+					pass
+				self._validators = validators
+				self._file_size = self.fh._file_size = validators["content-length"]
+				self._data.truncate(0)
+				self._save_metadata()
+		if not valid:
+			with self._lock:
+				self._get_usage(self.cachedir)[self.cachekey] = 0
+		return valid
+
+	# Save something in .extra
+	def save_extra(self, key:str, value):
+		with self._cond:
+			self.extra[key] = value
+			save_json(self._extra_file, self.extra)
+
 	def seek(self, offset, whence=0):
 		if self.debug:
 			print(f"FileCache seek({offset}, {whence})")
@@ -138,12 +394,9 @@ class FileCache(Seekable):
 		if b1 == b2:
 			data = self._get_block(b1)[b1first:b2last+1]
 		else:
-			blocks = [self._get_block(b1)[b1first:]]
-			for blocknum in range(b1+1, b2):
-				if self.debug:
-					print("middle block:", blocknum)
-				blocks.append(self._get_block(blocknum))
-			blocks.append(self._get_block(b2)[:b2last+1])
+			blocks = self._get_blocks(b1, b2)
+			blocks[0] = blocks[0][b1first:]
+			blocks[-1] = blocks[-1][:b2last+1]
 			data = b"".join(blocks)
 
 		assert len(data) == size, "FileCache read(%d) yielded %d bytes" % (size, len(data))
@@ -155,31 +408,153 @@ class FileCache(Seekable):
 		return (offset // self.blocksize, offset % self.blocksize)
 
 	def _get_block(self, blocknum:int, use_cache:bool=True):
-		block = self.cache.get(blocknum)
+		block = self._load_block(blocknum) if use_cache else None
 		if block is None:
-			cachefile = os.path.join(self.cachedir, f"{self.cachekey}-{blocknum:04d}")
-
-			if use_cache:
-				try:
-					with open(cachefile, "rb") as fh:
-						block = fh.read()
-				except FileNotFoundError:
-					pass
-
-			if block is None:
-				self.fh.seek(blocknum * self.blocksize)
-				block = self.fh.read(self.blocksize)
-				with open(cachefile, "wb") as fh:
-					fh.write(block)
-
-			self.cache[blocknum] = block
+			block = self._fetch_blocks(blocknum, 1)[0]
 		return block
 
+	# Get a range of blocks. Those not in the cache are fetched with one
+	# read for each run of adjacent missing blocks rather than one per block.
+	def _get_blocks(self, first:int, last:int):
+		blocks = [self._load_block(blocknum) for blocknum in range(first, last+1)]
+		blocknum = first
+		while blocknum <= last:
+			if blocks[blocknum - first] is not None:
+				blocknum += 1
+				continue
+			run_end = blocknum
+			while run_end + 1 <= last and blocks[run_end + 1 - first] is None:
+				run_end += 1
+			if self.debug:
+				print("missing blocks:", blocknum, run_end)
+			blocks[blocknum - first:run_end + 1 - first] = self._fetch_blocks(blocknum, run_end - blocknum + 1)
+			blocknum = run_end + 1
+		return blocks
+
+	# Read a block from the cache file, if we have it. If it is being
+	# prefetched, wait for it.
+	def _load_block(self, blocknum:int):
+		with self._cond:
+			while blocknum in self._pending:
+				self._cond.wait()
+			if not self._has_block(blocknum):
+				return None
+		offset = blocknum * self.blocksize
+		return pread(self._data, min(self.blocksize, self._file_size - offset), offset, self._io_lock)
+
+	# Read count blocks starting at blocknum from the underlying file
+	# and store them in the cache file
+	def _fetch_blocks(self, blocknum:int, count:int):
+		self.fh.seek(blocknum * self.blocksize)
+		data = self.fh.read(count * self.blocksize)
+		if self._file_size is None:
+			self._file_size = self.fh._file_size
+			self._data.truncate(self._file_size)		# sparse on most filesystems
+		self._store_blocks(blocknum, count, data)
+		return [data[i * self.blocksize:(i + 1) * self.blocksize] for i in range(count)]
+
+	def _store_blocks(self, blocknum:int, count:int, data:bytes):
+		pwrite(self._data, data, blocknum * self.blocksize, self._io_lock)
+		with self._cond:
+			for i in range(count):
+				self._set_block(blocknum + i)
+			if monotonic() - self._metadata_saved >= self.metadata_save_interval:
+				self._save_metadata()
+
+		with self._lock:
+			usage = self._get_usage(self.cachedir)
+			usage[self.cachekey] = self._cached_bytes()
+			usage.move_to_end(self.cachekey)
+			self._evict(self.cachedir)
+
+	# Start fetching the blocks of a byte range which are not yet in the
+	# cache using up to workers concurrent requests. The requests are
+	# started in order, so a reader who starts at the beginning of the
+	# range seldom has to wait long.
+	def prefetch(self, start:int, end:int, workers:int):
+		assert self._file_size is not None, "File size must be known"
+		first = start // self.blocksize
+		last = (min(end, self._file_size) - 1) // self.blocksize
+		with self._cond:
+			missing = [blocknum for blocknum in range(first, last + 1) if not self._has_block(blocknum) and blocknum not in self._pending]
+			self._pending.update(missing)
+		if not missing:
+			return
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+		# Split the missing blocks into runs of adjacent blocks
+		run_start = missing[0]
+		run_count = 1
+		for blocknum in missing[1:] + [None]:
+			if blocknum == run_start + run_count and run_count < self.prefetch_chunk_blocks:
+				run_count += 1
+				continue
+			self._executor.submit(self._prefetch_blocks, run_start, run_count)
+			if blocknum is not None:
+				run_start = blocknum
+				run_count = 1
+
+	def _prefetch_blocks(self, blocknum:int, count:int):
+		try:
+			http_file = getattr(self._local, "http_file", None)
+			if http_file is None:
+				http_file = self._local.http_file = self.fh.copy()
+			start = blocknum * self.blocksize
+			end = min((blocknum + count) * self.blocksize, self._file_size)
+			data = http_file._request_range(start, end - 1)
+			assert len(data) == end - start
+			self._store_blocks(blocknum, count, data)
+		except Exception as e:
+			# The reader will fetch these blocks itself
+			if self.debug:
+				print(f"FileCache prefetch of blocks {blocknum}-{blocknum + count - 1} failed: {e}")
+		finally:
+			with self._cond:
+				self._pending.difference_update(range(blocknum, blocknum + count))
+				self._cond.notify_all()
+
 	def close(self):
-		with open(self._metadata_file, "w") as fh:
-			json.dump({"file-size": self._file_size}, fh)
+		if self._data is None:		# already closed
+			return
+		if self._executor is not None:
+			self._executor.shutdown(cancel_futures=True)
+			self._pending.clear()
+		self._save_metadata()
+		self._data.close()
+		self._data = None
+		with self._lock:
+			self._open.discard((self.cachedir, self.cachekey))
 		self.fh.close()
 
+def save_json(filename:str, data):
+	tmpfile = filename + ".tmp"
+	with open(tmpfile, "w") as fh:
+		json.dump(data, fh)
+	os.replace(tmpfile, filename)
+
+# Read or write at an offset in a file without moving its file position.
+# Windows lacks os.pread() and os.pwrite(), so there we seek under a lock.
+def pread(fh, size:int, offset:int, lock:Lock):
+	if hasattr(os, "pread"):
+		return os.pread(fh.fileno(), size, offset)
+	with lock:
+		fh.seek(offset)
+		return fh.read(size)
+
+def pwrite(fh, data:bytes, offset:int, lock:Lock):
+	if hasattr(os, "pwrite"):
+		data = memoryview(data)
+		while data:
+			written = os.pwrite(fh.fileno(), data, offset)
+			data = data[written:]
+			offset += written
+	else:
+		with lock:
+			fh.seek(offset)
+			fh.write(data)
+			fh.flush()
+
 class FileRange(Seekable):
 	"""A seekable file-like object which represents a byte range offset into another file-like object"""
 	def __init__(self, fh, offset, size):
@@ -200,8 +575,12 @@ class FileRange(Seekable):
 class EmbeddedZipMixin:
 	"""
 	Add a function to ZipFile to open an embedded zip file, provided
-	it does not use additional compression.
+	it does not use additional compression, and one to extract a member
+	to a file which, for stored members of local zip files, lets the
+	kernel do the copying.
 	"""
+	copy_step = 64 * 1024 * 1024		# bytes copied between progress reports
+
 	def open_zipfile(self, filename):
 		"""Open an embedded zip file"""
 		if self.debug:
@@ -215,18 +594,62 @@ class EmbeddedZipMixin:
 		info = self.getinfo(filename)
 		assert info.compress_type == ZIP_STORED
 		zipfile = FileRange(self.fh,
-			offset = info.header_offset + len(info.FileHeader()),
+			offset = self.data_offset(info),
 			size = info.file_size,
 			)
 
 		if self.debug:
 			print("Wrapping contents in Zipfile...")
-		zipfile = ZipFile(zipfile)
+		zipfile = EmbeddedZip(zipfile, debug=self.debug)
 
 		if self.debug:
 			print("Wrapped.")
 		return zipfile
 
+	def data_offset(self, info:ZipInfo):
+		"""Find where a member's data starts by reading its local header"""
+		with self._lock:
+			self.fp.seek(info.header_offset)
+			header = self.fp.read(sizeFileHeader)
+		fheader = struct.unpack(structFileHeader, header)
+		if fheader[0] != stringFileHeader:
+			raise BadZipFile("Bad magic number for file header")
+		return info.header_offset + sizeFileHeader + fheader[10] + fheader[11]		# filename and extra field lengths
+
+	def extract_member(self, name, save_as:str, callback=None):
+		"""Copy a member to a file"""
+		info = name if isinstance(name, ZipInfo) else self.getinfo(name)
+		location = self._local_data_location(info)
+		with open(save_as, "wb") as dst:
+			if location is not None:
+				if self.debug:
+					print(f"Copying {info.filename} in kernel")
+				copy_file_data(location[0], location[1], dst.fileno(), info.file_size, self.copy_step, callback)
+			else:
+				with self.open(info) as src:
+					copied = 0
+					while (chunk := src.read(min(self.copy_step, 0x100000))):
+						dst.write(chunk)
+						copied += len(chunk)
+						if callback is not None and (copied % self.copy_step == 0 or copied == info.file_size):
+							callback("{total_recv} of {total_expected}", total_recv=copied, total_expected=info.file_size)
+
+	# If a member is stored (not compressed or encrypted) in a file on disk,
+	# return the file descriptor and the offset of its data. Embedded zip
+	# files are views (FileRange) of the file which contains them.
+	def _local_data_location(self, info:ZipInfo):
+		if info.compress_type != ZIP_STORED or info.flag_bits & 0x1:
+			return None
+		fh = self.fh
+		offset = self.data_offset(info)
+		while isinstance(fh, FileRange):
+			offset += fh._offset
+			fh = fh._fh
+		try:
+			return (fh.fileno(), offset)
+		except (AttributeError, OSError):
+			return None
+
 class LocalZip(ZipFile, EmbeddedZipMixin):
 	"""Same interface as RemoteZip, but for local file access."""
 	def __init__(self, path, debug=False):
@@ -236,15 +659,136 @@ class LocalZip(ZipFile, EmbeddedZipMixin):
 	def close(self):
 		self.fh.close()
 
+class EmbeddedZip(ZipFile, EmbeddedZipMixin):
+	"""A zip file stored within another one, as returned by .open_zipfile()"""
+	def __init__(self, fh, debug=False):
+		self.fh = fh
+		self.debug = debug
+		super().__init__(self.fh)
+
+# Copy size bytes from offset in one file to the current position in
+# another without passing them through Python. We use copy_file_range()
+# if we can (Linux), otherwise sendfile() (which on Linux can also write
+# to a file), otherwise plain reads and writes.
+def copy_file_data(src_fd:int, offset:int, dst_fd:int, size:int, step:int, callback=None):
+	methods = []
+	if hasattr(os, "copy_file_range"):
+		methods.append(lambda count: os.copy_file_range(src_fd, dst_fd, count, offset + copied))
+	if hasattr(os, "sendfile"):
+		methods.append(lambda count: os.sendfile(dst_fd, src_fd, offset + copied, count))
+	methods.append(lambda count: os.write(dst_fd, pread_fd(src_fd, min(count, 0x100000), offset + copied)))
+
+	copied = 0
+	while copied < size:
+		count = min(step, size - copied)
+		try:
+			written = methods[0](count)
+		except OSError as e:
+			if len(methods) == 1 or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSOCK, errno.EOPNOTSUPP, errno.EBADF):
+				raise
+			methods.pop(0)
+			continue
+		if written == 0:
+			raise BadZipFile("Unexpected end of file")
+		copied += written
+		if callback is not None:
+			callback("{total_recv} of {total_expected}", total_recv=copied, total_expected=size)
+
+def pread_fd(fd:int, size:int, offset:int):
+	if hasattr(os, "pread"):
+		return os.pread(fd, size, offset)
+	os.lseek(fd, offset, os.SEEK_SET)
+	return os.read(fd, size)
+
 class RemoteZip(ZipFile, EmbeddedZipMixin):
 	"""
 	Subclass ZipFile from the Python Standard Library so that we can
 	read zip files over HTTP rather than from the file system.
+
+	When a large member is opened, its bytes are prefetched into the
+	FileCache using prefetch_workers concurrent requests.
+
+	The central directory is kept with the FileCache. When we open the
+	file again, a HEAD request tells us whether it has changed. If it has
+	not, we have the list of members without reading anything more.
 	"""
+	prefetch_workers = 4
+	prefetch_threshold = 4 * 1024 * 1024
+
 	def __init__(self, url, cachedir=None, cachekey=None, debug=False):
 		self.debug = debug
 		self.fh = HttpFile(url, debug=debug)
+		try:
+			validators = self.fh.head()
+		except HttpFileError:
+			validators = None
 		self.fh = FileCache(self.fh, cachedir, cachekey, debug=debug)
+		self._validated = validators is not None
+		if self._validated:
+			self.fh.validate(validators)
 		super().__init__(self.fh)
+
+	# Called by ZipFile.__init__() to read the central directory
+	def _RealGetContents(self):
+		directory = self.fh.extra.get("central-directory") if self._validated else None
+		if directory is not None:
+			if self.debug:
+				print("Using cached central directory")
+			self.start_dir = directory["start-dir"]
+			self._comment = base64.b64decode(directory["comment"])
+			for fields in directory["members"]:
+				info = zipinfo_from_json(fields)
+				self.filelist.append(info)
+				self.NameToInfo[info.filename] = info
+			return
+
+		super()._RealGetContents()
+		if self._validated:
+			self.fh.save_extra("central-directory", {
+				"start-dir": self.start_dir,
+				"comment": base64.b64encode(self._comment).decode("ascii"),
+				"members": [zipinfo_to_json(info) for info in self.filelist],
+				})
+
+	def open(self, name, mode="r", *args, **kwargs):
+		if mode == "r" and self.prefetch_workers > 1:
+			info = name if isinstance(name, ZipInfo) else self.getinfo(name)
+			if info.compress_size >= self.prefetch_threshold:
+				start, end = self.member_range(info)
+				if self.debug:
+					print(f"Prefetching {info.filename}: {start}-{end}")
+				self.fh.prefetch(start, end, workers=self.prefetch_workers)
+		return super().open(name, mode, *args, **kwargs)
+
+	# Byte range of a member's local header and data as best we can tell
+	# from the central directory. The local header's extra field may not be
+	# the same length as the one in the central directory, so we allow a bit
+	# extra.
+	def member_range(self, info:ZipInfo):
+		start = info.header_offset
+		end = start + sizeFileHeader + len(info.orig_filename.encode("utf-8")) + len(info.extra) + info.compress_size + 1024
+		return start, min(end, self.start_dir)
+
 	def close(self):
 		self.fh.close()
+
+# Convert a ZipInfo object to and from a form which can be saved as JSON
+def zipinfo_to_json(info:ZipInfo):
+	fields = {}
+	for name in ZipInfo.__slots__:
+		if hasattr(info, name):
+			value = getattr(info, name)
+			if isinstance(value, bytes):
+				value = {"base64": base64.b64encode(value).decode("ascii")}
+			fields[name] = value
+	return fields
+
+def zipinfo_from_json(fields:dict):
+	info = ZipInfo()
+	for name, value in fields.items():
+		if isinstance(value, dict):
+			value = base64.b64decode(value["base64"])
+		elif isinstance(value, list):
+			value = tuple(value)
+		setattr(info, name, value)
+	return info
@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 from .obs_ws_5 import ObsControlBase, ObsError
 from ....utils.config import get_config, put_config
+from ....utils.tracer import tracer
 
 class ObsControl(ObsControlBase):
 	def __init__(self, *args, **kwargs):
@@ -175,6 +176,7 @@ class ObsControl(ObsControlBase):
 	# For videos enable audio monitoring.
 	#============================================================================
 
+	@tracer.traced("OBS scene", "scene_name")
 	def add_media_scene(self, scene_name:str, media_type:str, media_file:str, *, thumbnail:str=None, subtitle_track:str=None, skiplist:str=None):
 		logger.info("Add media_scene: \"%s\" %s \"%s\"", scene_name, media_type, media_file)
 
@@ -27,10 +27,17 @@ scene_name_prefixes = {
 # prefix -- media-type marker to put in front of scene name
 # close -- this is the last download in this group, close progress
 def load_video_url(scene_name:str, url:str, thumbnail_url:str=None, prefix:str="▷", close:bool=True, skiplist:str=None):
+	scene_name, video_file, thumbnail_file, subtitle_track = prepare_video_url(scene_name, url, thumbnail_url)
+	load_video_file(scene_name, video_file, thumbnail_file, subtitle_track, prefix, close, skiplist)
+
+# Download a video from JW.ORG along with its thumbnail and subtitles, but
+# do not create a scene. Returns what load_video_file() needs. This is the
+# part of load_video_url() which can be done for several videos at once.
+def prepare_video_url(scene_name:str, url:str, thumbnail_url:str=None, callback=progress_callback):
 	loading_video_message = _("Loading video \"{scene_name}\"...")
 
 	if scene_name is not None:
-		progress_callback(loading_video_message.format(scene_name=scene_name), cssclass="heading")
+		callback(loading_video_message.format(scene_name=scene_name), cssclass="heading")
 
 	video_metadata = meeting_loader.get_video_metadata(
 		url,
@@ -41,10 +48,10 @@ def load_video_url(scene_name:str, url:str, thumbnail_url:str=None, prefix:str="
 
 	if scene_name is None:
 		scene_name = video_metadata["title"]
-		progress_callback(loading_video_message.format(scene_name=scene_name), cssclass="heading")
+		callback(loading_video_message.format(scene_name=scene_name), cssclass="heading")
 
-	progress_callback(_("Downloading \"{url}\"...").format(url=unquote(video_metadata["url"])))
-	video_file = meeting_loader.download_media(video_metadata["url"], callback=progress_callback)
+	callback(_("Downloading \"{url}\"...").format(url=unquote(video_metadata["url"])))
+	video_file = meeting_loader.download_media(video_metadata["url"], callback=callback)
 
 	if thumbnail_url is None:
 		thumbnail_url = video_metadata["thumbnail_url"]
@@ -54,8 +61,8 @@ def load_video_url(scene_name:str, url:str, thumbnail_url:str=None, prefix:str="
 	elif thumbnail_url.startswith("/"):		# Caller-supplied thumbnail
 		thumbnail_file = thumbnail_url
 	else:									# Downloadable thumbnail
-		progress_callback(_("Downloading \"{url}\"...").format(url=unquote(thumbnail_url)))
-		thumbnail_file = meeting_loader.download_media(thumbnail_url, callback=progress_callback)
+		callback(_("Downloading \"{url}\"...").format(url=unquote(thumbnail_url)))
+		thumbnail_file = meeting_loader.download_media(thumbnail_url, callback=callback)
 
 	# If SUB_LANGUAGE is set and the video is subtitled, enable them.
 	subtitle_track = None
@@ -68,15 +75,15 @@ def load_video_url(scene_name:str, url:str, thumbnail_url:str=None, prefix:str="
 
 		# Different language. Download a VTT file, if one is available.
 		else:
-			progress_callback(_("Requesting subtitles download url for \"{scene_name}\"...").format(scene_name=scene_name))
+			callback(_("Requesting subtitles download url for \"{scene_name}\"...").format(scene_name=scene_name))
 			sub_video_metadata = meeting_loader.get_video_metadata(url, language=sub_language)
 			if sub_video_metadata.get("subtitles_url") is not None:
-				progress_callback(_("Downloading subtitles from \"{subtitles_url}\"...").format(**sub_video_metadata))
-				subtitles_file = meeting_loader.download_media(sub_video_metadata["subtitles_url"], callback=progress_callback)
+				callback(_("Downloading subtitles from \"{subtitles_url}\"...").format(**sub_video_metadata))
+				subtitles_file = meeting_loader.download_media(sub_video_metadata["subtitles_url"], callback=callback)
 				os.rename(subtitles_file, os.path.splitext(video_file)[0] + ".vtt")
 				subtitle_track = 2
 
-	load_video_file(scene_name, video_file, thumbnail_file, subtitle_track, prefix, close, skiplist)
+	return scene_name, video_file, thumbnail_file, subtitle_track
 
 def load_video_file(scene_name:str, video_file:str, thumbnail_file:str=None, subtitle_track:str=None, prefix:str="▷", close:bool=True, skiplist:str=None):
 	try:
@@ -102,10 +109,14 @@ def load_video_file(scene_name:str, video_file:str, thumbnail_file:str=None, sub
 # close -- this is the last download in this group, close progress
 def load_image_url(scene_name:str, url:str, thumbnail_url:str=None, skiplist:str=None, close:bool=True):
 	#assert thumbnail_url is None, "not supported yet"
-	progress_callback(_("Loading image \"{scene_name}\"...").format(scene_name=scene_name), cssclass="heading")
-	image_file = meeting_loader.download_media(url, callback=progress_callback)
+	image_file = prepare_image_url(scene_name, url)
 	load_image_file(scene_name, image_file, None, skiplist, close)
 
+# Download an image, but do not create a scene. Returns the file.
+def prepare_image_url(scene_name:str, url:str, callback=progress_callback):
+	callback(_("Loading image \"{scene_name}\"...").format(scene_name=scene_name), cssclass="heading")
+	return meeting_loader.download_media(url, callback=callback)
+
 def load_image_file(scene_name:str, image_file:str, thumbnail_file:str=None, skiplist:str=None, close:bool=True):
 	assert thumbnail_file is None, "not supported yet"
 	try:
@@ -150,20 +161,29 @@ def load_pdf_file(scene_name:str, pdf_file:str, thumbnail_file:str=None, skiplis
 # thumbnail_url -- optional link to small image used in link to this webpage
 # close -- this is the last download in this group, close progress
 def load_webpage(scene_name:str, url:str, thumbnail_url:str=None, skiplist=None, close:bool=True):
+	scene_name, thumbnail = prepare_webpage(scene_name, url, thumbnail_url)
+	load_webpage_scene(scene_name, url, thumbnail, skiplist, close)
+
+# Get the title and thumbnail of a webpage, but do not create a scene.
+# Returns the scene name and the downloaded thumbnail.
+def prepare_webpage(scene_name:str, url:str, thumbnail_url:str=None, callback=progress_callback):
 	if scene_name is None or thumbnail_url is None:
 		metadata = meeting_loader.get_webpage_metadata(url)
 	if scene_name is None:
 		scene_name = metadata.title or _("Untitled Webpage")
 	if thumbnail_url is None:
 		thumbnail_url = metadata.thumbnail_url
-	progress_callback(_("Loading webpage \"{scene_name}\"...").format(scene_name=scene_name), cssclass="heading")
+	callback(_("Loading webpage \"{scene_name}\"...").format(scene_name=scene_name), cssclass="heading")
 
 	if thumbnail_url is not None:
-		progress_callback(_("Downloading \"{url}\"...").format(url=unquote(thumbnail_url)))
-		thumbnail = meeting_loader.download_media(thumbnail_url, callback=progress_callback)
+		callback(_("Downloading \"{url}\"...").format(url=unquote(thumbnail_url)))
+		thumbnail = meeting_loader.download_media(thumbnail_url, callback=callback)
 	else:
 		thumbnail = None
 
+	return scene_name, thumbnail
+
+def load_webpage_scene(scene_name:str, url:str, thumbnail:str=None, skiplist=None, close:bool=True):
 	progress_callback(_("Loading webpage \"{scene_name}\"...").format(scene_name=scene_name))
 	try:
 		obs.add_media_scene(
@@ -236,15 +256,21 @@ def load_media_file(scene_name:str, media_file:str, mimetype:str, thumbnail_file
 
 def load_meeting_media_item(item:MeetingMediaItem):
 	"""Load a media item from the Meeting Workbook or Watchtower"""
+	prepare_meeting_media_item(item)()
+
+def prepare_meeting_media_item(item:MeetingMediaItem, callback=progress_callback):
+	"""Download what a media item needs and return a function which creates its scene"""
 	assert isinstance(item, MeetingMediaItem)
 	logger.info("Loading media item: %s", repr(item))
 	if item.media_type == "web":		# HTML page
-		load_webpage(item.title, item.media_url, thumbnail_url=item.thumbnail_url, close=False)
-	elif item.pub_code is not None and item.pub_code.startswith("sjj"):
-		load_video_url(item.title, item.media_url, thumbnail_url=item.thumbnail_url, prefix="♫ ", close=False)
-	elif item.media_type == "video":
-		load_video_url(item.title, item.media_url, thumbnail_url=item.thumbnail_url, close=False)
+		scene_name, thumbnail = prepare_webpage(item.title, item.media_url, thumbnail_url=item.thumbnail_url, callback=callback)
+		return lambda: load_webpage_scene(scene_name, item.media_url, thumbnail, close=False)
+	elif item.media_type == "video" or (item.pub_code is not None and item.pub_code.startswith("sjj")):
+		prefix = "♫ " if item.pub_code is not None and item.pub_code.startswith("sjj") else "▷"
+		scene_name, video_file, thumbnail_file, subtitle_track = prepare_video_url(item.title, item.media_url, thumbnail_url=item.thumbnail_url, callback=callback)
+		return lambda: load_video_file(scene_name, video_file, thumbnail_file, subtitle_track, prefix=prefix, close=False)
 	elif item.media_type == "image":
-		load_image_url(item.title, item.media_url, thumbnail_url=item.thumbnail_url, close=False)
+		image_file = prepare_image_url(item.title, item.media_url, callback=callback)
+		return lambda: load_image_file(item.title, image_file, close=False)
 	else:
 		raise AssertionError("Unhandled case")
@@ -130,14 +130,7 @@ class ZippedPlaylist:
 			zip_reader = zip_reader.open_zipfile("contents")
 			id = id[9:]
 
-		with zip_reader.open(id) as fh1:
-			with open(save_as + ".tmp", "wb") as fh2:
-				while True:
-					chunk = fh1.read(0x10000) # 64k
-					if not chunk:
-						break
-					fh2.write(chunk)
-
+		zip_reader.extract_member(id, save_as + ".tmp", callback=callback)
 		os.rename(save_as + ".tmp", save_as)
 
 		return save_as
@@ -0,0 +1,29 @@
+from flask import render_template, abort, jsonify
+
+from .views import blueprint
+from ...utils.tracer import tracer
+from ...jworg.fetcher import Fetcher
+from ...jworg.meetings import MeetingLoader
+
+# Timings of recent meeting media extractions and loads shown as a
+# waterfall, followed by the hit counts of the caches. This page is not
+# in the menu. It is for finding out where the time goes when loading a
+# meeting is slow.
+@blueprint.route("/debug/")
+def page_debug():
+	caches = [("Parsed articles", MeetingLoader.article_cache.stats())]
+	if Fetcher.http_cache is not None:
+		caches.append(("HTTP", Fetcher.http_cache.stats()))
+	return render_template("khplayer/debug.html", runs=tracer.get_runs(), caches=caches, top="..")
+
+# The same timings as JSON for saving or comparing
+@blueprint.route("/debug/runs.json")
+def page_debug_runs_json():
+	return jsonify([run.to_dict() for run in tracer.get_runs()])
+
+@blueprint.route("/debug/<int:run_id>.json")
+def page_debug_run_json(run_id):
+	run = tracer.get_run(run_id)
+	if run is None:
+		abort(404)
+	return jsonify(run.to_dict())
@@ -1,25 +1,37 @@
-from flask import current_app, render_template, request, redirect, stream_with_context
-from datetime import date
+from flask import current_app, render_template, request, redirect, stream_with_context, copy_current_request_context
+from datetime import date, datetime, timedelta
+import os
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import or_, and_
 from dataclasses import asdict
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 import traceback
 import logging
 
-from ...utils.background import turbo, progress_callback, progress_response, run_thread, async_flash
-from ...models import db, Weeks, MeetingCache
+from ...utils.background import turbo, progress_callback, progress_response, run_thread, async_flash, CombinedProgress
+from ...utils.single_flight import SingleFlight
+from ...utils.tracer import tracer
+from ...models import db, Weeks, MeetingCache, Articles
 from ...cli_jworg import update_weeks
 from ...utils.babel import gettext as _
 from . import menu
 from .views import blueprint
 from .utils.controllers import meeting_loader, obs, ObsError
-from .utils.scenes import load_meeting_media_item
+from .utils.scenes import prepare_meeting_media_item
 from ...jworg.meetings import MeetingMediaItem
+from ...jworg.meetings_epub import EpubMeetingLoader
+from ...jworg.epub import EpubLoader
 
 logger = logging.getLogger(__name__)
 
 menu.append((_("Meetings"), "/meetings/"))
 
+# Extractions in progress, so that a second browser opening the same meeting
+# shares the first one's extraction rather than starting another.
+meeting_extractions = SingleFlight("meeting extraction")
+
 # List upcoming meetings
 @blueprint.route("/meetings/")
 def page_meetings():
@@ -56,6 +68,7 @@ def page_meetings_view(docid):
 		"khplayer/meetings_meeting.html",
 		meeting_title = title,
 		meeting_url = meeting_loader.meeting_url(docid),
+		docid = docid,
 		top = "../.."
 		)
 
@@ -77,9 +90,12 @@ def page_meetings_view_stream(docid):
 
 				# We use a small Jinja2 template to render the media item to HTML.
 				data = render_template("khplayer/meetings_media_item.html",
-					index = index,
-					item = item,
-					new_section = (item.section_title != previous_section),
+					docid = docid,
+					rows = [{
+						"index": index,
+						"item": item,
+						"new_section": (item.section_title != previous_section),
+						}],
 					)
 
 				# Send the media item to the page over the Turbo Stream.
@@ -126,7 +142,7 @@ def page_meetings_download(docid):
 	selected = set(map(int, request.form.getlist("selected")))
 	media = []
 	index = 0
-	for item in get_meeting_media(docid):
+	for item in get_meeting_media(docid, refresh=False):
 		if index in selected:
 			media.append(item)
 		index += 1
@@ -137,36 +153,140 @@ def page_meetings_download(docid):
 	return progress_response(None)
 
 # Download the meeting article (from the Watchtower or Workbook) and
-# extract a list of the videos and images. Implements caching.
-def get_meeting_media(docid):
+# extract a list of the videos and images. Implements caching. If refresh
+# is True, an old list from the cache is checked for changes in the background.
+def get_meeting_media(docid, refresh=True):
 
-	# Look for this meeting's media in the DB cache table
-	# FIXME: Race condition can produce duplicate cache entries, so we use first().
-	meeting = MeetingCache.query.filter_by(lang=meeting_loader.language, docid=docid).first()
-	if meeting is not None:
+	# Look for this meeting's media in the DB cache table. Entries made by
+	# an older version of the extractor are ignored.
+	meeting = MeetingCache.query.filter_by(lang=meeting_loader.language, docid=docid).one_or_none()
+	if meeting is not None and meeting.extraction_version == meeting_loader.extraction_version and not missing_local_files(meeting.media):
 		#progress_callback("Meeting is already in cache.")
 		# Deserialize list from JSON back to objects
 		for item in meeting.media:
 			yield MeetingMediaItem(**item)
+
+		# If the list is old, check JW.ORG for corrections in the background.
+		max_age = timedelta(seconds=current_app.config["MEETING_CACHE_MAX_AGE"])
+		if refresh and (meeting.extracted_at is None or datetime.now() - meeting.extracted_at > max_age):
+			refresh_meeting_media(docid, meeting.media)
 		return
 
-	# Use the meeting loader to download the article and scan it for media
-	# such as videos and illustrations. This is an iterator, so we can
-	# yield items as they are obtained. Also save them in a list for the cache.
-	media = []
-	for item in meeting_loader.extract_media(meeting_loader.meeting_url(docid), callback=progress_callback):
-		yield item
-		media.append(item)
+	# If no one else is doing so already, extract the media in the background.
+	yield from meeting_extractions.run((meeting_loader.language, docid), lambda: extract_meeting_media(docid))
+
+# Use the meeting loader to download the article and scan it for media
+# such as videos and illustrations. This is an iterator, so we can
+# yield items as they are obtained. Also save them in a list for the cache.
+def extract_meeting_media(docid, callback=progress_callback):
+	with tracer.run("Extract meeting media", docid=docid) as run:
+		epub_meeting_loader = open_meeting_epub(docid) if current_app.config["MEETING_MEDIA_FROM_EPUB"] else None
+		if epub_meeting_loader is not None:
+			run.label(source="EPUB")
+			items = save_epub_href(docid, epub_meeting_loader, epub_meeting_loader.extract_media(docid, callback=callback))
+		else:
+			items = meeting_loader.extract_media(meeting_loader.meeting_url(docid), callback=callback)
+		media = []
+		try:
+			for item in items:
+				yield item
+				media.append(item)
+		finally:
+			if epub_meeting_loader is not None:
+				epub_meeting_loader.epub.close()
+		run.label(items=len(media))
 
 	# Serialize the meeting's media list to JSON and store in DB cache table
-	meeting = MeetingCache(lang=meeting_loader.language, docid=docid, media=list(map(lambda item: asdict(item), media)))
-	db.session.add(meeting)
-	db.session.commit()
+	media = list(map(lambda item: asdict(item), media))
+	MeetingCache.store(meeting_loader.language, docid, media, meeting_loader.extraction_version)
+	return media
+
+# If the EPUB of the Workbook or Watchtower issue which contains this
+# meeting's article has been downloaded, return a loader which extracts
+# the media from it. Otherwise return None.
+def open_meeting_epub(docid):
+	article = Articles.query.filter_by(lang=meeting_loader.language, docid=str(docid)).first()
+	if article is None or article.issue is None or article.issue.epub_filename is None:
+		return None
+	epub_filename = os.path.join(current_app.config["MEDIA_CACHEDIR"], article.issue.epub_filename)
+	if not os.path.exists(epub_filename):
+		return None
+	logger.info("Extracting media for %d from %s", docid, epub_filename)
+	return EpubMeetingLoader(
+		EpubLoader(epub_filename),
+		article.issue.pub_code,
+		article.issue.issue_code,
+		document_href = article.epub_href,
+		language = meeting_loader.language,
+		cachedir = current_app.config["MEDIA_CACHEDIR"],
+		)
+
+# Pass through the items from an EPUB meeting loader. Once it has found the
+# article in the EPUB, remember where so that next time it need not search.
+def save_epub_href(docid, epub_meeting_loader, items):
+	yield from items
+	article = Articles.query.filter_by(lang=meeting_loader.language, docid=str(docid)).first()
+	if article is not None and epub_meeting_loader.document_href is not None and article.epub_href != epub_meeting_loader.document_href:
+		article.epub_href = epub_meeting_loader.document_href
+		db.session.commit()
+
+# Pictures copied out of an EPUB are in the media list as file: URLs. Return
+# True if the cache cleaner has since deleted any of them, in which case the
+# list must be extracted again.
+def missing_local_files(media):
+	for item in media:
+		url = item.get("media_url")
+		if url is not None and url.startswith("file:") and not os.path.exists(url2pathname(urlparse(url).path)):
+			logger.info("Local file of cached media list is gone: %s", url)
+			return True
+	return False
+
+# Extract a meeting's media list again without showing progress. If it has
+# changed, replace the list on the page of any browser which is showing it.
+def refresh_meeting_media(docid, old_media):
+	def refresher():
+		media = yield from extract_meeting_media(docid, callback=lambda message, **kwargs: logger.debug("Refresh %d: %s", docid, message))
+		if media == old_media:
+			logger.info("Media list for %d is unchanged", docid)
+			return
+		logger.info("Media list for %d has changed", docid)
+		rows = []
+		previous_section = None
+		for index, item in enumerate(media):
+			rows.append({
+				"index": index,
+				"item": MeetingMediaItem(**item),
+				"new_section": (item["section_title"] != previous_section),
+				})
+			previous_section = item["section_title"]
+		data = render_template("khplayer/meetings_media_rows.html", rows=rows)
+		turbo.push(turbo.update(data, target=f"media-list-{docid}"))
+	meeting_extractions.run((meeting_loader.language, docid), refresher)
 
 # This function is run in a background thread to download
 # the media and add a scene in OBS for each item.
+#
+# The media are downloaded by a pool of worker threads which share one
+# progress bar. The scenes are created here in meeting order, each as
+# soon as its item and those before it are ready.
 def load_meeting_media(title, items):
 	progress_callback(_("Loading media for \"{title}\"...").format(title=title), cssclass="heading")
-	for item in items:
-		load_meeting_media_item(item)
+	progress = CombinedProgress()
+
+	def prepare(index, item):
+		with tracer.span("item", title=item.title, media_type=item.media_type):
+			return prepare_meeting_media_item(item, callback=progress.callback_for(index))
+
+	with tracer.run("Load meeting media", title=title, items=len(items)):
+		executor = ThreadPoolExecutor(max_workers=current_app.config["MEDIA_DOWNLOAD_WORKERS"], thread_name_prefix="media")
+		try:
+			futures = [
+				executor.submit(copy_current_request_context(tracer.wrap(prepare)), index, item)
+				for index, item in enumerate(items)
+				]
+			for future in futures:
+				create_scene = future.result()
+				create_scene()
+		finally:
+			executor.shutdown(cancel_futures=True)
 	progress_callback(_("✔ All requested media have been loaded."), last_message=True, cssclass="success")
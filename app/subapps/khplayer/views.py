@@ -44,6 +44,7 @@ from . import view_jwstream
 from . import view_songbook
 from . import view_slides
 from . import view_videos
+from . import view_debug
 if sys.platform == "linux" and current_app.config["PATCHBAY"]:
 	from . import view_patchbay
 	from . import view_patchbay_config
@@ -1,7 +1,7 @@
 # Run downloads in a background thread
 
 from flask import current_app, session, copy_current_request_context, flash as flask_flash
-from threading import Thread, current_thread
+from threading import Thread, Lock, current_thread
 from markupsafe import escape
 import traceback
 import logging
@@ -48,6 +48,37 @@ def progress_callback(message, last_message=False, **kwargs):
 	except KeyError:
 		logger.warning("No Turbo connection from client: %s", to)
 
+# Show the progress of several downloads which are running at once as a
+# single progress bar. Each task (which may download several files one
+# after another) gets its own callback from .callback_for(). Other messages
+# are passed through to the callback supplied.
+class CombinedProgress:
+	def __init__(self, callback=progress_callback):
+		self.callback = callback
+		self.lock = Lock()
+		self.downloads = {}		# (received, expected) of current download of each task
+		self.finished = 0		# bytes in earlier downloads of the tasks
+		self.percent = None
+
+	def callback_for(self, key):
+		def callback(message, last_message=False, **kwargs):
+			if message != "{total_recv} of {total_expected}":
+				self.callback(message, **kwargs)
+				return
+			with self.lock:
+				received, expected = self.downloads.get(key, (0, 0))
+				if kwargs["total_expected"] != expected or kwargs["total_recv"] < received:
+					self.finished += expected		# task has gone on to its next file
+				self.downloads[key] = (kwargs["total_recv"], kwargs["total_expected"])
+				total_recv = self.finished + sum(download[0] for download in self.downloads.values())
+				total_expected = self.finished + sum(download[1] for download in self.downloads.values())
+				percent = int(total_recv * 100 / total_expected + 0.5)
+				if percent == self.percent:		# don't flood the browser with updates
+					return
+				self.percent = percent
+			self.callback(message, total_recv=total_recv, total_expected=total_expected)
+		return callback
+
 # Send an update to the web browser in response to a form submission.
 def progress_response(message, last_message=False, **kwargs):
 	logger.debug("Response message: %s", message)
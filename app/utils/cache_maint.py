@@ -33,6 +33,9 @@ def scan_cache(clean=False, print_summary_table=True):
 		elif entry.name.startswith("user-"):
 			category = "User-Supplied Files"
 			lifetime = 14
+		elif entry.name.startswith("epub-"):
+			category = "Images from EPUBs"
+			lifetime = 30
 		elif entry.name.endswith(".epub"):
 			category = "EPUB Files"
 			lifetime = 365
@@ -0,0 +1,23 @@
+# Carry the Flask context into worker threads
+#
+# Worker threads start without an application context, so gettext() in
+# them cannot find the configured locale and returns the English text, and
+# the database cannot be used. Wrap the function to be run in a worker with
+# copy_current_context() in the thread which submits it. Wrap it again
+# for each submission: a copied request context may only be active in one
+# thread at a time.
+
+from flask import current_app, has_app_context, has_request_context, copy_current_request_context
+from functools import wraps
+
+def copy_current_context(fn):
+	if has_request_context():
+		return copy_current_request_context(fn)
+	if has_app_context():
+		app = current_app._get_current_object()
+		@wraps(fn)
+		def wrapper(*args, **kwargs):
+			with app.app_context():
+				return fn(*args, **kwargs)
+		return wrapper
+	return fn
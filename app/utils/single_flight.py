@@ -0,0 +1,89 @@
+# Run a long task only once even if several requests ask for it at once
+#
+# The first caller to ask for a key starts a background thread which runs
+# a generator and saves the items it produces. Callers who ask for the
+# same key while it is running get the items produced so far and then
+# the rest as they arrive. Running the generator in its own thread means
+# it finishes (and saves its result) even if the browser which started it
+# goes away.
+
+from flask import copy_current_request_context, has_request_context
+from threading import Thread, Lock, Condition
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Flight:
+	def __init__(self):
+		self.items = []
+		self.done = False
+		self.error = None
+		self.condition = Condition()
+
+	def add(self, item):
+		with self.condition:
+			self.items.append(item)
+			self.condition.notify_all()
+
+	def finish(self, error=None):
+		with self.condition:
+			self.done = True
+			self.error = error
+			self.condition.notify_all()
+
+	# Yield all the items, waiting for those which have not yet been produced
+	def subscribe(self):
+		index = 0
+		while True:
+			with self.condition:
+				while index >= len(self.items) and not self.done:
+					self.condition.wait()
+				items = self.items[index:]
+				done = self.done
+				error = self.error
+			yield from items
+			index += len(items)
+			if done and index >= len(self.items):
+				if error is not None:
+					raise error
+				return
+
+class SingleFlight:
+	def __init__(self, name):
+		self.name = name
+		self.lock = Lock()
+		self.flights = {}
+
+	# Return an iterator over the items produced by producer(), a function
+	# which returns an iterator. If another caller is already running the
+	# producer for this key, the iterator returns its items instead.
+	def run(self, key, producer):
+		with self.lock:
+			flight = self.flights.get(key)
+			if flight is not None:
+				logger.info("Joining %s already in progress for %s", self.name, key)
+				return flight.subscribe()
+			flight = self.flights[key] = Flight()
+
+		def target():
+			try:
+				for item in producer():
+					flight.add(item)
+			except Exception as e:
+				# Followers may have gone away (or there may never have been
+				# any, as with a background refresh), so log it here too.
+				logger.exception("%s for %s failed", self.name, key)
+				flight.finish(error=e)
+			else:
+				flight.finish()
+			finally:
+				with self.lock:
+					del self.flights[key]
+
+		# Take the Flask request context along so that the producer can
+		# use the database and send progress messages to the browser.
+		if has_request_context():
+			target = copy_current_request_context(target)
+
+		Thread(target=target, daemon=True, name=f"{self.name} {key}").start()
+		return flight.subscribe()
@@ -0,0 +1,198 @@
+# Record how long the stages of a long task such as loading a meeting's
+# media take, so that we can see where the time goes.
+#
+# A task is wrapped in tracer.run(). Within it, tracer.span() (or a
+# function decorated with @tracer.traced()) records a nested timing with
+# labels such as the URL loaded. Spans outside of a run cost next to
+# nothing and are not recorded. The most recent runs are kept in memory
+# for display on a debug page.
+#
+# Each thread has its own stack of open spans. Work handed to another
+# thread can be made part of the current span by wrapping the function
+# with tracer.wrap().
+
+from threading import local, Lock, current_thread
+from contextlib import contextmanager
+from collections import deque
+from functools import wraps
+from itertools import count
+from datetime import datetime
+from time import perf_counter
+import inspect
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Span:
+	def __init__(self, run, id, parent, name, labels):
+		self.run = run
+		self.id = id
+		self.parent = parent
+		self.depth = parent.depth + 1 if parent is not None else 0
+		self.name = name
+		self.labels = labels
+		self.thread = current_thread().name
+		self.start = perf_counter()
+		self.end = None
+
+	# Add labels after the span has started, such as the number of bytes loaded
+	def label(self, **labels):
+		self.labels.update(labels)
+
+	@property
+	def duration(self):
+		return (self.end if self.end is not None else perf_counter()) - self.start
+
+	def to_dict(self):
+		return {
+			"id": self.id,
+			"parent": self.parent.id if self.parent is not None else None,
+			"depth": self.depth,
+			"name": self.name,
+			"labels": self.labels,
+			"thread": self.thread,
+			"start": self.start - self.run.root.start,
+			"duration": self.duration,
+			"finished": self.end is not None,
+			}
+
+# Stands in for a span when no run is being traced
+class NullSpan:
+	def label(self, **labels):
+		pass
+
+class Run:
+	def __init__(self, id, name, labels):
+		self.id = id
+		self.started = datetime.now()
+		self.lock = Lock()
+		self.spans = []
+		self.error = None
+		self.root = self.add_span(None, name, labels)
+
+	def add_span(self, parent, name, labels):
+		with self.lock:
+			span = Span(self, len(self.spans), parent, name, labels)
+			self.spans.append(span)
+		return span
+
+	@property
+	def name(self):
+		return self.root.name
+
+	@property
+	def duration(self):
+		return self.root.duration
+
+	@property
+	def finished(self):
+		return self.root.end is not None
+
+	def to_dict(self):
+		with self.lock:
+			spans = list(self.spans)
+		return {
+			"id": self.id,
+			"name": self.name,
+			"started": self.started.isoformat(),
+			"duration": self.duration,
+			"finished": self.finished,
+			"error": self.error,
+			"spans": [span.to_dict() for span in spans],
+			}
+
+class Tracer:
+	max_runs = 10
+
+	def __init__(self):
+		self.lock = Lock()
+		self.runs = deque()
+		self.run_ids = count(1)
+		self.local = local()
+
+	# Start tracing a new run of a task
+	@contextmanager
+	def run(self, name, **labels):
+		run = Run(next(self.run_ids), name, labels)
+		with self.lock:
+			self.runs.append(run)
+			while len(self.runs) > self.max_runs:
+				self.runs.popleft()
+		saved_stack = getattr(self.local, "stack", None)
+		self.local.stack = [run.root]
+		try:
+			yield run.root
+		except Exception as e:
+			run.error = f"{type(e).__name__}: {str(e)}"
+			raise
+		finally:
+			run.root.end = perf_counter()
+			self.local.stack = saved_stack
+			logger.debug("Run %d \"%s\" took %.3f seconds", run.id, name, run.duration)
+
+	# Time a stage of the current run
+	@contextmanager
+	def span(self, name, **labels):
+		stack = getattr(self.local, "stack", None)
+		if not stack:
+			yield NullSpan()
+			return
+		parent = stack[-1]
+		span = parent.run.add_span(parent, name, labels)
+		stack.append(span)
+		try:
+			yield span
+		finally:
+			span.end = perf_counter()
+			stack.pop()
+
+	# Decorator which puts each call of a function in a span. The values
+	# of the named arguments become labels. If result is given, it is called
+	# with the return value and returns further labels.
+	def traced(self, name, *arg_names, result=None):
+		def decorator(fn):
+			signature = inspect.signature(fn)
+			@wraps(fn)
+			def wrapper(*args, **kwargs):
+				if not getattr(self.local, "stack", None):
+					return fn(*args, **kwargs)
+				bound = signature.bind(*args, **kwargs)
+				labels = {arg_name: bound.arguments.get(arg_name) for arg_name in arg_names}
+				with self.span(name, **labels) as span:
+					value = fn(*args, **kwargs)
+					if result is not None:
+						span.label(**result(value))
+					return value
+			return wrapper
+		return decorator
+
+	# Wrap a function which is to be run in another thread so that its
+	# spans are recorded under the span which is open in this thread.
+	def wrap(self, fn):
+		stack = getattr(self.local, "stack", None)
+		if not stack:
+			return fn
+		parent = stack[-1]
+		@wraps(fn)
+		def wrapper(*args, **kwargs):
+			saved_stack = getattr(self.local, "stack", None)
+			self.local.stack = [parent]
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				self.local.stack = saved_stack
+		return wrapper
+
+	# Return the recorded runs, most recent first
+	def get_runs(self):
+		with self.lock:
+			return list(reversed(self.runs))
+
+	def get_run(self, id):
+		with self.lock:
+			for run in self.runs:
+				if run.id == id:
+					return run
+		return None
+
+tracer = Tracer()
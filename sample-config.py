@@ -65,3 +65,73 @@ SECRET_KEY = "__secret_key_here__"
 # Format: CSV
 # Column: URL
 #JWSTREAM_UPDATES = "URL Here"
+
+# Size limit of the cache of web pages and API responses from JW.ORG
+# (in bytes, defaults to 64 megabytes)
+#HTTP_CACHE_MAX_SIZE = 128 * 1024 * 1024
+
+# Size limit of the cache of parts of playlists and other zip files read
+# from Google Drive (in bytes, defaults to one gigabyte). When it is full,
+# those used least recently are removed.
+#GDRIVE_CACHE_MAX_SIZE = 4 * 1024 * 1024 * 1024
+
+# Limits on how fast requests are sent to each host. "interval" is the
+# number of seconds per request and "burst" is how many requests may be
+# sent at once after a quiet period. Host names may contain wildcards.
+# Defaults: 2.5 seconds for wol.jw.org, www.jw.org, and unlisted hosts,
+# 0.1 second with bursts of 10 for the JW.ORG CDN's.
+#FETCHER_RATE_LIMITS = {
+#	"*.jw-cdn.org": {"interval": 0.05, "burst": 20},
+#	}
+
+# Download videos larger than 16 megabytes in this many pieces at once.
+# This can help on links with high latency. (Defaults to 1, no splitting.)
+#DOWNLOAD_SEGMENTS = 4
+
+# How many links in a meeting article to look up at once. The rate limits
+# above still apply. (Set to 1 to look them up one at a time.)
+#LINK_RESOLUTION_WORKERS = 4
+
+# How many of a meeting's videos and pictures to download at once when
+# loading them into OBS. The scenes are still created in meeting order.
+# (Set to 1 to download them one at a time.)
+#MEDIA_DOWNLOAD_WORKERS = 3
+
+# Approximate memory (in bytes) to devote to keeping parsed study articles
+# which are linked from several weeks of the Meeting Workbook
+#ARTICLE_CACHE_MAX_SIZE = 32 * 1024 * 1024
+
+# Seconds for which a parsed study article is used before it is downloaded
+# again, so that corrections on JW.ORG are picked up (Default one hour)
+#ARTICLE_CACHE_MAX_AGE = 3600
+
+# Media lists of meetings older than this (in seconds) are shown at once
+# but checked against JW.ORG in the background. (Default one day)
+#MEETING_CACHE_MAX_AGE = 86400
+
+# If the EPUB of the Meeting Workbook or Watchtower issue has been downloaded
+# (in the EPUB Reader), take the meeting media from it rather than from the
+# web pages. Pictures then come from the EPUB, so they are available offline.
+#MEETING_MEDIA_FROM_EPUB = True
+
+# Record the pages and API responses loaded from JW.ORG in a directory or
+# play them back from it without going to the network. This is for testing.
+# It can also be set with the environment variable of the same name.
+#FETCHER_CASSETTE = "record:/tmp/cassette"
+#FETCHER_CASSETTE = "replay:/tmp/cassette"
+
+# How long to keep metadata of videos from JW.ORG (in seconds, default one week)
+# and how long to remember that a video is not yet available (default one hour)
+#METADATA_CACHE_TTL = 7 * 86400
+#METADATA_CACHE_NEGATIVE_TTL = 3600
+
+# Dump what is loaded from JW.ORG for debugging: 1 for API responses,
+# 2 for the figures in meeting articles as well. The dumps go to the log
+# (at debug level) or, if DEBUG_DUMP_DIR is set, to numbered files there.
+# Only the most recent 200 files are kept.
+#DEBUG_DUMP_LEVEL = 2
+#DEBUG_DUMP_DIR = "/tmp/pub-tools-dumps"
+
+# How many meeting media extractions and loads to keep timings for.
+# The timings are shown as a waterfall at /khplayer/debug/.
+#TRACER_MAX_RUNS = 10